@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""Benchmark approximate (IVF) against exact accident report search.
+
+Reports recall@k and p50/p99 single-query latency for several `n_probe`
+values on a seeded, synthetic clustered corpus.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_ann.py [--reports 200000] [--dim 768]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from farsight.ann import IVFAccidentIndex, _normalize
+from farsight.retrieval import AccidentIndex
+
+
+def _make_corpus(num_reports, num_queries, dim, seed):
+    """Create normalized embeddings clustered around random topics."""
+    rng = np.random.default_rng(seed)
+    num_topics = max(1, num_reports // 500)
+    topics = rng.normal(size=(num_topics, dim)).astype(np.float32)
+
+    labels = rng.integers(0, num_topics, size=num_reports)
+    embeddings = topics[labels] + rng.normal(size=(num_reports, dim)).astype(np.float32)
+    query_labels = rng.integers(0, num_topics, size=num_queries)
+    queries = topics[query_labels] + rng.normal(size=(num_queries, dim)).astype(
+        np.float32
+    )
+
+    return _normalize(embeddings), _normalize(queries)
+
+
+def _latencies(search, queries):
+    """Time each query separately and return latencies in ms."""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query[None, :])
+        latencies.append((time.perf_counter() - start) * 1e3)
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--reports", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=300)
+    parser.add_argument("--num-lists", type=int, default=None)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    embeddings, queries = _make_corpus(args.reports, args.queries, args.dim, args.seed)
+    report_ids = np.arange(args.reports)
+
+    exact = AccidentIndex(embeddings, report_ids)
+    start = time.perf_counter()
+    ivf = IVFAccidentIndex.build(embeddings, report_ids, num_lists=args.num_lists)
+    build_time = time.perf_counter() - start
+
+    exact_indices, _ = exact.top_k(queries, args.k)
+    exact_latencies = _latencies(lambda q: exact.top_k(q, args.k), queries)
+
+    print(
+        f"reports: {args.reports}, dim: {args.dim}, queries: {args.queries}, "
+        f"lists: {ivf.centroids.shape[0]}, build: {build_time:.2f} s"
+    )
+    print(f"{'method':>12} {'recall@' + str(args.k):>11} {'p50 ms':>9} {'p99 ms':>9}")
+    print(
+        f"{'exact':>12} {1.0:>11.4f} {np.percentile(exact_latencies, 50):>9.3f} "
+        f"{np.percentile(exact_latencies, 99):>9.3f}"
+    )
+
+    for n_probe in args.n_probe:
+        ivf_indices, _ = ivf.top_k(queries, args.k, n_probe=n_probe)
+        hits = 0
+        for exact_row, ivf_row in zip(exact_indices, ivf_indices):
+            ivf_ids = ivf.report_ids[ivf_row[ivf_row >= 0]]
+            hits += np.intersect1d(report_ids[exact_row], ivf_ids).shape[0]
+        recall = hits / exact_indices.size
+
+        latencies = _latencies(lambda q: ivf.top_k(q, args.k, n_probe=n_probe), queries)
+        print(
+            f"{'ivf/' + str(n_probe):>12} {recall:>11.4f} "
+            f"{np.percentile(latencies, 50):>9.3f} {np.percentile(latencies, 99):>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""Micro-benchmark for the per-render cost of `farsight._make_html`.
+
+Compares rendering with a cold bundle cache (what every render used to cost)
+against rendering with a warm cache.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_render.py [--renders 20] [--bundle-mb 3]
+
+If the package does not ship a built farsight.js (e.g., in a fresh checkout),
+a synthetic bundle of the given size is used instead.
+"""
+
+import argparse
+import os
+import random
+import string
+import tempfile
+import timeit
+
+from farsight import farsight
+
+
+def _make_synthetic_bundle(size_mb):
+    """Write a random JS-like file of roughly `size_mb` MB and return its path."""
+    rng = random.Random(0)
+    chars = string.ascii_letters + string.digits + "<>&'\" {}();=\n"
+    chunk = "".join(rng.choice(chars) for _ in range(1 << 16))
+    fd, path = tempfile.mkstemp(suffix=".js")
+    with os.fdopen(fd, "w", encoding="utf8") as fp:
+        for _ in range(int(size_mb * (1 << 20)) // len(chunk)):
+            fp.write(chunk)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--renders", type=int, default=20)
+    parser.add_argument("--bundle-mb", type=float, default=3)
+    args = parser.parse_args()
+
+    synthetic_path = None
+    if not os.path.exists(farsight._JS_BUNDLE_PATH):
+        synthetic_path = _make_synthetic_bundle(args.bundle_mb)
+        farsight._JS_BUNDLE_PATH = synthetic_path
+
+    def cold_render():
+        farsight._clear_bundle_cache()
+        farsight._make_html("Summarize the following email", "farsight")
+
+    def warm_render():
+        farsight._make_html("Summarize the following email", "farsight")
+
+    try:
+        bundle_mb = os.path.getsize(farsight._JS_BUNDLE_PATH) / (1 << 20)
+        cold = timeit.timeit(cold_render, number=args.renders) / args.renders
+        warm_render()
+        warm = timeit.timeit(warm_render, number=args.renders) / args.renders
+
+        print(f"bundle size: {bundle_mb:.2f} MB, renders: {args.renders}")
+        print(f"uncached render: {cold * 1e3:10.3f} ms")
+        print(f"cached render:   {warm * 1e3:10.3f} ms")
+        print(f"speedup:         {cold / warm:10.1f}x")
+    finally:
+        if synthetic_path is not None:
+            os.remove(synthetic_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+
+"""Benchmark suite for the widget rendering and accident retrieval paths.
+
+Cases (all on seeded, synthetic data, so the suite runs offline):
+    render/<component>     `_make_html()` with a warm bundle cache, for each
+                           component, plus render/cold with a cold cache
+    load/json/<n>          `AccidentIndex.from_json()` on n report embeddings
+    load/binary/<n>        `AccidentIndex.from_binary()` on the same data
+    topk/<n>               `AccidentIndex.top_k()` for a batch of queries
+
+The input files are written by a short-lived subprocess, so the suite process
+stays small, and each case runs in a fresh subprocess and records:
+    wall_*_s               wall time of repeated runs
+    alloc_peak_bytes       peak bytes allocated during one run (tracemalloc, in
+                           a separate run, since tracing slows down the code)
+    retained_blocks        change of `sys.getallocatedblocks()` over one
+                           untraced run, i.e., the small object blocks held by
+                           its result (e.g., a loaded index). Large buffers
+                           such as NumPy arrays are not counted, and this is a
+                           net count, not the number of allocations made.
+    baseline_rss_bytes     peak RSS of the subprocess after loading the case's
+                           inputs, before the case runs
+    peak_rss_bytes         peak RSS of the subprocess after the case
+
+Peak RSS is read from VmHWM in /proc/self/status, which starts over in each
+subprocess. Elsewhere, it falls back to `ru_maxrss`.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_suite.py run -o results.json [--quick]
+    PYTHONPATH=. python benchmarks/bench_suite.py compare base.json results.json \
+        [--threshold 0.1]
+
+`compare` prints the relative change of each case and exits with status 1 if
+any wall time or peak allocation grew by more than the threshold.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from bench_ann import _make_corpus
+from bench_render import _make_synthetic_bundle
+from farsight import farsight
+from farsight.embedding_store import load_embeddings, write_embeddings
+from farsight.retrieval import AccidentIndex
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+COMPONENTS = ["farsight", "lite", "incident", "use-cases", "signal"]
+PROMPT = "Summarize the following email in three bullet points."
+
+# Metrics that are compared between runs (lower is better)
+COMPARED_METRICS = ["wall_median_s", "alloc_peak_bytes"]
+
+
+def _peak_rss_bytes():
+    """Get the peak resident set size of this process, or None if unknown."""
+    # A child process inherits its parent's ru_maxrss on Linux, but VmHWM
+    # starts over at exec
+    try:
+        with open("/proc/self/status", "r", encoding="utf8") as fp:
+            for line in fp:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _measure(fn, repeats):
+    """
+    Measure a benchmark case.
+
+    Args:
+        fn(callable): Function with no arguments to benchmark
+        repeats(int): Number of timed runs
+
+    Return:
+        Dict of metrics
+    """
+    # Warm up caches and lazy imports
+    fn()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    # Blocks allocated by a run and not freed yet, mostly its result
+    blocks_before = sys.getallocatedblocks()
+    result = fn()
+    blocks = sys.getallocatedblocks() - blocks_before
+    del result
+
+    # Trace allocations in a separate run, since tracing slows down the code
+    tracemalloc.start()
+    base_size = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1] - base_size
+    tracemalloc.stop()
+    del result
+
+    return {
+        "repeats": repeats,
+        "wall_min_s": min(times),
+        "wall_median_s": statistics.median(times),
+        "wall_mean_s": statistics.mean(times),
+        "alloc_peak_bytes": peak,
+        "retained_blocks": blocks,
+        "peak_rss_bytes": _peak_rss_bytes(),
+    }
+
+
+def _write_inputs(size, dim, num_queries, seed, data_dir):
+    """Write the embeddings and queries of the retrieval cases at one size."""
+    embeddings, queries = _make_corpus(size, num_queries, dim, seed)
+    report_ids = np.arange(size)
+
+    json_path = os.path.join(data_dir, "embeddings-{}.json".format(size))
+    with open(json_path, "w", encoding="utf8") as fp:
+        json.dump(
+            {
+                "embeddings": embeddings.round(6).tolist(),
+                "reportNumbers": report_ids.tolist(),
+            },
+            fp,
+        )
+    write_embeddings(
+        os.path.join(data_dir, "embeddings-{}.bin".format(size)), embeddings, report_ids
+    )
+    np.save(os.path.join(data_dir, "queries-{}.npy".format(size)), queries)
+
+
+def write_inputs(args):
+    """Write the inputs of the retrieval cases at each size."""
+    for size in args.sizes:
+        _write_inputs(size, args.dim, args.queries, args.seed, args.data_dir)
+
+
+def _run_script(command, *arguments):
+    """Run a subcommand of this script in a fresh Python process."""
+    return subprocess.run(
+        [sys.executable, os.path.abspath(__file__), command] + list(arguments),
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    ).stdout
+
+
+def _make_case(name, data_dir, k):
+    """
+    Load the inputs of a case.
+
+    Args:
+        name(str): Case name, e.g., "topk/1000"
+        data_dir(str): Folder of the files from `_write_inputs()`
+        k(int): Number of results of the top-k cases
+
+    Return:
+        Function with no arguments to benchmark
+    """
+    parts = name.split("/")
+
+    if parts[0] == "render" and parts[1] == "cold":
+
+        def cold_render():
+            farsight._clear_bundle_cache()
+            return farsight._make_html(PROMPT, "farsight")
+
+        return cold_render
+
+    if parts[0] == "render":
+        return lambda: farsight._make_html(PROMPT, parts[1])
+
+    if parts[0] == "load":
+        if parts[1] == "json":
+            path = os.path.join(data_dir, "embeddings-{}.json".format(parts[2]))
+            return lambda: AccidentIndex.from_json(path)
+        path = os.path.join(data_dir, "embeddings-{}.bin".format(parts[2]))
+        return lambda: AccidentIndex.from_binary(path)
+
+    if parts[0] == "topk":
+        embeddings, report_ids = load_embeddings(
+            os.path.join(data_dir, "embeddings-{}.bin".format(parts[1]))
+        )
+        index = AccidentIndex(np.array(embeddings), np.array(report_ids))
+        queries = np.load(os.path.join(data_dir, "queries-{}.npy".format(parts[1])))
+        return lambda: index.top_k(queries, k)
+
+    raise ValueError("Unknown case: {}.".format(name))
+
+
+def run_case(args):
+    """Run one case in this process and print its metrics as JSON."""
+    if args.bundle is not None:
+        farsight._JS_BUNDLE_PATH = args.bundle
+
+    fn = _make_case(args.name, args.data_dir, args.k)
+    baseline_rss = _peak_rss_bytes()
+    metrics = _measure(fn, args.repeats)
+    metrics["baseline_rss_bytes"] = baseline_rss
+
+    if args.name.startswith("render/"):
+        metrics["output_bytes"] = len(fn())
+    json.dump(metrics, sys.stdout)
+
+
+def _run_case(name, repeats, data_dir, k, bundle_path):
+    """Run a case in a fresh subprocess, so its peak RSS is its own."""
+    arguments = [name, "--data-dir", data_dir, "--repeats", str(repeats), "--k", str(k)]
+    if bundle_path is not None:
+        arguments += ["--bundle", bundle_path]
+    return json.loads(_run_script("case", *arguments))
+
+
+def run(args):
+    """Run the suite and write the results as JSON."""
+    synthetic_path = None
+    if not os.path.exists(farsight._JS_BUNDLE_PATH):
+        synthetic_path = _make_synthetic_bundle(args.bundle_mb)
+
+    sizes = [1000, 5000] if args.quick else args.sizes
+    repeats = 3 if args.quick else args.repeats
+
+    cases = [("render/cold", repeats)]
+    cases += [("render/{}".format(c), repeats) for c in COMPONENTS]
+    for size in sizes:
+        cases += [
+            ("load/json/{}".format(size), max(1, repeats // 4)),
+            ("load/binary/{}".format(size), repeats),
+            ("topk/{}".format(size), repeats),
+        ]
+
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as data_dir:
+            _run_script(
+                "inputs",
+                "--data-dir",
+                data_dir,
+                "--sizes",
+                *[str(size) for size in sizes],
+                "--dim",
+                str(args.dim),
+                "--queries",
+                str(args.queries),
+                "--seed",
+                str(args.seed),
+            )
+
+            for name, case_repeats in cases:
+                results[name] = _run_case(
+                    name, case_repeats, data_dir, args.k, synthetic_path
+                )
+                if name.startswith("topk/"):
+                    results[name]["queries"] = args.queries
+    finally:
+        if synthetic_path is not None:
+            os.remove(synthetic_path)
+
+    output = {
+        "meta": {
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "synthetic_bundle": synthetic_path is not None,
+        },
+        "results": results,
+    }
+
+    if args.output is None:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w", encoding="utf8") as fp:
+            json.dump(output, fp, indent=2)
+
+        for name, metrics in results.items():
+            print(
+                "{:<20} {:>10.3f} ms {:>12,} B peak {:>14,} B peak RSS".format(
+                    name,
+                    metrics["wall_median_s"] * 1e3,
+                    metrics["alloc_peak_bytes"],
+                    metrics["peak_rss_bytes"] or 0,
+                )
+            )
+
+
+def compare(args):
+    """
+    Compare two result files and report regressions.
+
+    Return:
+        Exit status, 1 if there is any regression beyond the threshold
+    """
+    with open(args.base, "r", encoding="utf8") as fp:
+        base = json.load(fp)["results"]
+    with open(args.new, "r", encoding="utf8") as fp:
+        new = json.load(fp)["results"]
+
+    regressions = []
+    print(
+        "{:<20} {:<17} {:>14} {:>14} {:>9}".format(
+            "case", "metric", "base", "new", "change"
+        )
+    )
+
+    for name in base:
+        if name not in new:
+            print("{:<20} missing in {}".format(name, args.new))
+            continue
+
+        for metric in COMPARED_METRICS:
+            old_value = base[name][metric]
+            new_value = new[name][metric]
+            change = (new_value - old_value) / old_value if old_value > 0 else 0.0
+
+            flag = ""
+            if change > args.threshold:
+                flag = " REGRESSION"
+                regressions.append((name, metric))
+
+            print(
+                "{:<20} {:<17} {:>14.6g} {:>14.6g} {:>+8.1%}{}".format(
+                    name, metric, old_value, new_value, change, flag
+                )
+            )
+
+    print("{} regression(s) beyond {:.0%}.".format(len(regressions), args.threshold))
+    return 1 if len(regressions) > 0 else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("-o", "--output", default=None, help="JSON output path")
+    run_parser.add_argument("--quick", action="store_true", help="small sizes only")
+    run_parser.add_argument("--repeats", type=int, default=10)
+    run_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000, 50000]
+    )
+    run_parser.add_argument("--dim", type=int, default=768)
+    run_parser.add_argument("--queries", type=int, default=16)
+    run_parser.add_argument("--k", type=int, default=300)
+    run_parser.add_argument("--bundle-mb", type=float, default=3)
+    run_parser.add_argument("--seed", type=int, default=0)
+
+    inputs_parser = subparsers.add_parser(
+        "inputs", help="write the retrieval inputs (used by run)"
+    )
+    inputs_parser.add_argument("--data-dir", required=True, help="output folder")
+    inputs_parser.add_argument("--sizes", type=int, nargs="+", required=True)
+    inputs_parser.add_argument("--dim", type=int, default=768)
+    inputs_parser.add_argument("--queries", type=int, default=16)
+    inputs_parser.add_argument("--seed", type=int, default=0)
+
+    case_parser = subparsers.add_parser("case", help="run one case (used by run)")
+    case_parser.add_argument("name", help="case name, e.g., topk/1000")
+    case_parser.add_argument("--data-dir", required=True, help="folder of the inputs")
+    case_parser.add_argument("--repeats", type=int, default=10)
+    case_parser.add_argument("--k", type=int, default=300)
+    case_parser.add_argument("--bundle", default=None, help="JavaScript bundle path")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two runs")
+    compare_parser.add_argument("base", help="baseline results JSON")
+    compare_parser.add_argument("new", help="new results JSON")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.1, help="allowed relative increase"
+    )
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.error("a command is required")
+
+    if args.command == "run":
+        run(args)
+    elif args.command == "inputs":
+        write_inputs(args)
+    elif args.command == "case":
+        run_case(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,3 +10,4 @@ __email__ = "jayw@zijie.wang"
 __version__ = version
 
 from farsight.farsight import *
+from farsight.headless import envision_headless
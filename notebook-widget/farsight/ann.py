@@ -0,0 +1,297 @@
+"""Approximate nearest neighbor search over accident report embeddings.
+
+`IVFAccidentIndex` is an inverted file (IVF) index implemented with NumPy
+only. Reports are clustered with spherical k-means, and each query only scores
+the reports in its `n_probe` most similar clusters. Larger `n_probe` gives
+higher recall at the cost of latency. `farsight.retrieval.AccidentIndex` stays
+the exact reference.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from farsight import metrics
+from farsight.retrieval import (
+    MAX_RELEVANT_ACCIDENT_SIZE,
+    MIN_SCORE,
+    _top_k,
+    _to_relevant_accidents,
+)
+
+FORMAT_VERSION = 1
+_ARRAY_NAMES = ["centroids", "embeddings", "report_ids", "list_offsets"]
+
+
+def _assign(data, centroids, batch_size=4096):
+    """
+    Assign each row to its most similar centroid.
+
+    Args:
+        data(np.ndarray): Rows with shape [num_rows, dim]
+        centroids(np.ndarray): Centroids with shape [num_lists, dim]
+        batch_size(int): Number of rows scored together
+
+    Return:
+        Centroid index of each row
+    """
+    assignments = np.empty(data.shape[0], dtype=np.int64)
+    for start in range(0, data.shape[0], batch_size):
+        scores = data[start : start + batch_size] @ centroids.T
+        assignments[start : start + batch_size] = np.argmax(scores, axis=1)
+    return assignments
+
+
+def _normalize(data):
+    """Scale each row to unit norm."""
+    norms = np.linalg.norm(data, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return data / norms
+
+
+def _spherical_kmeans(data, num_lists, num_iters, rng):
+    """
+    Cluster rows by cosine similarity.
+
+    Args:
+        data(np.ndarray): Rows with shape [num_rows, dim]
+        num_lists(int): Number of clusters
+        num_iters(int): Number of k-means iterations
+        rng(np.random.Generator): Random generator for initialization
+
+    Return:
+        Unit-norm centroids with shape [num_lists, dim]
+    """
+    centroids = _normalize(data[rng.choice(data.shape[0], num_lists, replace=False)])
+
+    for _ in range(num_iters):
+        assignments = _assign(data, centroids)
+        counts = np.bincount(assignments, minlength=num_lists)
+
+        # Sum the rows of each cluster without a Python loop
+        order = np.argsort(assignments, kind="stable")
+        non_empty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[non_empty]
+        sums = np.add.reduceat(data[order], starts, axis=0)
+
+        # Re-seed empty clusters with random rows
+        new_centroids = data[rng.choice(data.shape[0], num_lists)].copy()
+        new_centroids[non_empty] = sums
+        centroids = _normalize(new_centroids)
+
+    return centroids.astype(np.float32)
+
+
+class IVFAccidentIndex:
+    """
+    Inverted file index for approximate accident report similarity search.
+
+    Reports are stored grouped by cluster, so the reports of each cluster
+    are one contiguous slice of `embeddings`.
+    """
+
+    def __init__(self, centroids, embeddings, report_ids, list_offsets, n_probe=8):
+        """
+        Use `IVFAccidentIndex.build()` or `IVFAccidentIndex.load()` to create an
+        index.
+
+        Args:
+            centroids(np.ndarray): Cluster centroids with shape [num_lists, dim]
+            embeddings(np.ndarray): Report embeddings grouped by cluster
+            report_ids(np.ndarray): Accident report ID of each embedding row
+            list_offsets(np.ndarray): Start of each cluster in `embeddings`,
+                with shape [num_lists + 1]
+            n_probe(int): Default number of clusters to scan for each query
+        """
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.report_ids = np.asarray(report_ids)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.n_probe = n_probe
+
+        if self.list_offsets.shape[0] != self.centroids.shape[0] + 1:
+            raise ValueError("list_offsets must have one more entry than centroids.")
+
+    @classmethod
+    def build(
+        cls,
+        embeddings,
+        report_ids,
+        num_lists=None,
+        num_iters=10,
+        max_train_size=None,
+        n_probe=8,
+        seed=0,
+    ):
+        """
+        Build an index from report embeddings.
+
+        Args:
+            embeddings(array-like): Report embeddings with shape [num_reports, dim]
+            report_ids(array-like): Accident report ID of each embedding row
+            num_lists(int?): Number of clusters, default 4 * sqrt(num_reports)
+            num_iters(int): Number of k-means iterations
+            max_train_size(int?): Number of sampled reports to train k-means
+                on, default 64 * num_lists
+            n_probe(int): Default number of clusters to scan for each query
+            seed(int): Random seed for k-means
+
+        Return:
+            IVFAccidentIndex
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        report_ids = np.asarray(report_ids)
+        num_reports = embeddings.shape[0]
+
+        if num_lists is None:
+            num_lists = int(4 * np.sqrt(num_reports))
+        num_lists = max(1, min(num_lists, num_reports))
+
+        if max_train_size is None:
+            max_train_size = 64 * num_lists
+
+        rng = np.random.default_rng(seed)
+        train = embeddings
+        if num_reports > max_train_size:
+            train = embeddings[rng.choice(num_reports, max_train_size, replace=False)]
+
+        centroids = _spherical_kmeans(train, num_lists, num_iters, rng)
+
+        # Group the reports by their cluster
+        assignments = _assign(embeddings, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=num_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        return cls(
+            centroids, embeddings[order], report_ids[order], list_offsets, n_probe
+        )
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load an index saved by `IVFAccidentIndex.save()`.
+
+        Args:
+            path(str): Index directory
+            mmap(bool): Memory-map the arrays instead of reading them
+
+        Return:
+            IVFAccidentIndex
+        """
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf8") as fp:
+            meta = json.load(fp)
+
+        if meta["version"] != FORMAT_VERSION:
+            raise ValueError(
+                "Unsupported index version {} (expected {}).".format(
+                    meta["version"], FORMAT_VERSION
+                )
+            )
+
+        arrays = {
+            name: np.load(
+                os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None
+            )
+            for name in _ARRAY_NAMES
+        }
+        return cls(n_probe=meta["n_probe"], **arrays)
+
+    def save(self, path):
+        """
+        Save the index into a directory of .npy files.
+
+        Args:
+            path(str): Index directory, created if it does not exist
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAY_NAMES:
+            np.save(os.path.join(path, name + ".npy"), getattr(self, name))
+
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf8") as fp:
+            json.dump({"version": FORMAT_VERSION, "n_probe": self.n_probe}, fp)
+
+    def __len__(self):
+        return self.embeddings.shape[0]
+
+    def top_k(self, query_embeddings, k=MAX_RELEVANT_ACCIDENT_SIZE, n_probe=None):
+        """
+        Find the approximate top k most similar reports for a batch of queries.
+
+        Args:
+            query_embeddings(array-like): Queries with shape [num_queries, dim]
+            k(int): Number of reports to return for each query
+            n_probe(int?): Number of clusters to scan, default `self.n_probe`
+
+        Return:
+            (indices, scores) arrays with shape [num_queries, k], sorted by
+            descending score. Indices are rows of `self.embeddings`. If the
+            scanned clusters have fewer than k reports, the rows are padded
+            with index -1 and score -inf.
+        """
+        queries = np.atleast_2d(np.ascontiguousarray(query_embeddings, np.float32))
+        n_probe = self.n_probe if n_probe is None else n_probe
+        n_probe = max(1, min(n_probe, self.centroids.shape[0]))
+        k = min(k, len(self))
+
+        with metrics.span("similarity_scoring", {"n_probe": n_probe}):
+            probes, _ = _top_k(queries @ self.centroids.T, n_probe)
+
+            indices = np.full((queries.shape[0], k), -1, dtype=np.int64)
+            scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+
+            for i, query in enumerate(queries):
+                candidates = np.concatenate(
+                    [
+                        np.arange(self.list_offsets[p], self.list_offsets[p + 1])
+                        for p in probes[i]
+                    ]
+                )
+                if candidates.shape[0] == 0:
+                    continue
+
+                candidate_scores = self.embeddings[candidates] @ query
+                top_indices, top_scores = _top_k(candidate_scores[None, :], k)
+                count = top_indices.shape[1]
+                indices[i, :count] = candidates[top_indices[0]]
+                scores[i, :count] = top_scores[0]
+
+        return indices, scores
+
+    def query(
+        self,
+        query_embeddings,
+        min_score=MIN_SCORE,
+        k=MAX_RELEVANT_ACCIDENT_SIZE,
+        n_probe=None,
+    ):
+        """
+        Find relevant accident reports for one or many query embeddings.
+
+        Args:
+            query_embeddings(array-like): One query with shape [dim], or a
+                batch of queries with shape [num_queries, dim]
+            min_score(float): Minimal similarity score to keep a report
+            k(int): Maximal number of reports to return for each query
+            n_probe(int?): Number of clusters to scan, default `self.n_probe`
+
+        Return:
+            A list of `RelevantAccident` dicts ({"accidentReportID",
+            "similarity"}) sorted by descending similarity for a single query,
+            or a list of such lists for a batch of queries
+        """
+        is_single = np.ndim(query_embeddings) == 1
+        indices, scores = self.top_k(query_embeddings, k, n_probe)
+
+        results = []
+        for i in range(indices.shape[0]):
+            # Drop the padding, which even min_score=-inf would keep
+            found = indices[i] >= 0
+            results.append(
+                _to_relevant_accidents(
+                    self.report_ids, indices[i][found], scores[i][found], min_score
+                )
+            )
+
+        return results[0] if is_single else results
@@ -0,0 +1,362 @@
+"""Concurrent, rate-limited, and resumable text embedding pipeline.
+
+The pipeline splits texts into batches, embeds the batches concurrently with a
+thread pool under a token-bucket rate limit, retries transient API errors, and
+appends every finished batch to a JSONL checkpoint file. Rerunning the pipeline
+with the same checkpoint skips texts that have already been embedded by the
+same model.
+
+Usage:
+    backend = PalmEmbeddingBackend(api_key)
+    pipeline = EmbeddingPipeline(backend, "embeddings.jsonl", requests_per_second=5)
+    embeddings = pipeline.run(prompts)
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from farsight import metrics
+
+EMBEDDING_SIZE = 768
+
+# HTTP status codes that are worth retrying
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class EmbeddingAPIError(Exception):
+    """Error returned by an embedding API."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def _post_json(url, body, timeout):
+    """
+    Send a JSON POST request and parse the JSON response.
+
+    Args:
+        url(str): Request URL
+        body(dict): JSON body
+        timeout(float): Request timeout in seconds
+
+    Return:
+        Parsed JSON response
+    """
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+    except urllib.error.HTTPError as error:
+        raise EmbeddingAPIError(
+            "Embedding API error {}: {}".format(
+                error.code, error.read().decode("utf-8", "replace")
+            ),
+            status=error.code,
+        ) from error
+
+
+class EmbeddingBackend:
+    """
+    Base class for embedding APIs. Subclasses implement `embed_batch()`.
+    """
+
+    # Maximal number of texts the API accepts in one request
+    max_batch_size = 1
+
+    # Model name, part of the checkpoint keys so a checkpoint of another model
+    # is not reused
+    model = None
+
+    def embed_batch(self, texts):
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts(list[str]): Texts to embed, at most `max_batch_size` items
+
+        Return:
+            List of embeddings (list[float]) in the same order as texts
+        """
+        raise NotImplementedError
+
+
+class PalmEmbeddingBackend(EmbeddingBackend):
+    """
+    PaLM embedding API (the same model as the text embedding worker).
+    """
+
+    max_batch_size = 100
+
+    def __init__(self, api_key, model="embedding-gecko-001", timeout=60):
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+
+    def embed_batch(self, texts):
+        # PaLM does not support empty string, we just return 0 vector for them
+        non_empty = [t for t in texts if t != ""]
+        values = []
+
+        if len(non_empty) > 0:
+            url = "https://generativelanguage.googleapis.com/v1beta2/models/{}:batchEmbedText?{}".format(
+                self.model, urllib.parse.urlencode({"key": self.api_key})
+            )
+            data = _post_json(url, {"texts": non_empty}, self.timeout)
+            values = [e["value"] for e in data["embeddings"]]
+
+        values = iter(values)
+        return [[0.0] * EMBEDDING_SIZE if t == "" else next(values) for t in texts]
+
+
+class FarsightEndpointBackend(EmbeddingBackend):
+    """
+    Farsight's API endpoint (see `getEmbeddingFarsight()` in farsight-gen.ts).
+    The endpoint embeds one text per request.
+    """
+
+    max_batch_size = 1
+    model = "gemini-embedding"
+
+    def __init__(self, endpoint, timeout=60):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def embed_batch(self, texts):
+        url = "{}{}{}".format(
+            self.endpoint,
+            "&" if "?" in self.endpoint else "?",
+            urllib.parse.urlencode({"type": "run"}),
+        )
+
+        embeddings = []
+        for text in texts:
+            body = {"prompt": text, "temperature": 0.2, "model": self.model}
+            data = _post_json(url, body, self.timeout)
+            embeddings.append(data["payload"]["result"])
+        return embeddings
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate(float): Number of tokens added per second
+            capacity(float?): Maximal number of tokens, default max(1, rate)
+        """
+        self.rate = rate
+        self.capacity = max(1.0, rate) if capacity is None else capacity
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Block until the given number of tokens is available, then take them.
+
+        Args:
+            tokens(float): Number of tokens to take
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+
+                wait = (tokens - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def text_key(text, model=None):
+    """
+    Get the checkpoint key of a text.
+
+    Args:
+        text(str): Input text
+        model(str?): Name of the embedding model
+
+    Return:
+        SHA-256 hex digest of the text, or of the model and the text
+    """
+    if model is not None:
+        text = json.dumps([model, text])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingPipeline:
+    """
+    Embed many texts concurrently with rate limiting, retries, and an
+    incremental checkpoint.
+    """
+
+    def __init__(
+        self,
+        backend,
+        checkpoint_path=None,
+        batch_size=32,
+        max_workers=8,
+        requests_per_second=None,
+        max_retries=5,
+        backoff=1.0,
+    ):
+        """
+        Args:
+            backend(EmbeddingBackend): Embedding API to call
+            checkpoint_path(str?): JSONL file to store finished embeddings. If
+                None, results are only kept in memory.
+            batch_size(int): Number of texts in each request, capped by the
+                backend's `max_batch_size`
+            max_workers(int): Number of concurrent requests
+            requests_per_second(float?): Rate limit, default no limit
+            max_retries(int): Number of retries for transient errors
+            backoff(float): Base delay in seconds of the exponential backoff
+        """
+        self.backend = backend
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = max(1, min(batch_size, backend.max_batch_size))
+        self.max_workers = max_workers
+        self.rate_limiter = (
+            None if requests_per_second is None else TokenBucket(requests_per_second)
+        )
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.embeddings = {}
+        self.lock = threading.Lock()
+        self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        """Load finished embeddings from the checkpoint file."""
+        if self.checkpoint_path is None or not os.path.exists(self.checkpoint_path):
+            return
+
+        line = ""
+        with open(self.checkpoint_path, "r", encoding="utf8") as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Skip a line that was cut off when a previous run stopped
+                    continue
+                self.embeddings[record["key"]] = record["embedding"]
+
+        # Terminate a cut-off last line so new records start on their own line
+        if line != "" and not line.endswith("\n"):
+            with open(self.checkpoint_path, "a", encoding="utf8") as fp:
+                fp.write("\n")
+
+    def _save_batch(self, keys, embeddings):
+        """Store a finished batch in memory and append it to the checkpoint."""
+        with self.lock:
+            if self.checkpoint_path is not None:
+                with open(self.checkpoint_path, "a", encoding="utf8") as fp:
+                    for key, embedding in zip(keys, embeddings):
+                        fp.write(json.dumps({"key": key, "embedding": embedding}))
+                        fp.write("\n")
+
+            for key, embedding in zip(keys, embeddings):
+                self.embeddings[key] = embedding
+
+    def _is_retryable(self, error):
+        """Check if an error is transient (rate limit, server, or network)."""
+        if isinstance(error, EmbeddingAPIError):
+            return error.status is None or error.status in _RETRYABLE_STATUS
+        return isinstance(error, (urllib.error.URLError, ConnectionError, TimeoutError))
+
+    def _embed_with_retry(self, texts):
+        """Embed one batch, retrying transient errors with exponential backoff."""
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            try:
+                metrics.increment("embedding_api_calls")
+                with metrics.span("embedding_call", {"batch_size": len(texts)}):
+                    embeddings = self.backend.embed_batch(texts)
+            except Exception as error:
+                if attempt == self.max_retries or not self._is_retryable(error):
+                    raise
+                metrics.increment("embedding_retries")
+                time.sleep(self.backoff * (2**attempt) * (0.5 + random.random()))
+                continue
+
+            if len(embeddings) != len(texts):
+                raise EmbeddingAPIError(
+                    "Expected {} embeddings but got {}.".format(
+                        len(texts), len(embeddings)
+                    )
+                )
+            return embeddings
+
+    def _run_batch(self, texts):
+        """Embed one batch and checkpoint the results."""
+        embeddings = self._embed_with_retry(texts)
+        self._save_batch([text_key(t, self.backend.model) for t in texts], embeddings)
+
+    def run(self, texts):
+        """
+        Embed texts, skipping texts that are already in the checkpoint.
+
+        Args:
+            texts(iterable[str]): Texts to embed
+
+        Return:
+            List of embeddings (list[float]) in the same order as texts
+        """
+        texts = list(texts)
+
+        # Only embed unique texts that are not in the checkpoint yet
+        pending = {}
+        for text in texts:
+            key = text_key(text, self.backend.model)
+            if key not in self.embeddings and key not in pending:
+                pending[key] = text
+
+        pending_texts = list(pending.values())
+        metrics.increment("embedding_checkpoint_hits", len(texts) - len(pending_texts))
+        batches = [
+            pending_texts[i : i + self.batch_size]
+            for i in range(0, len(pending_texts), self.batch_size)
+        ]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._run_batch, batch) for batch in batches]
+
+            # Raise the first error. Retries are exhausted by now, so the error
+            # would repeat for the queued batches (e.g., an invalid API key).
+            # Cancel them; batches that are already running still finish and
+            # are checkpointed for the rerun.
+            for future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    for pending_future in futures:
+                        pending_future.cancel()
+                    raise
+
+        return [self.embeddings[text_key(t, self.backend.model)] for t in texts]
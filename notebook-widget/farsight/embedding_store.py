@@ -0,0 +1,179 @@
+"""Compact binary format for the accident report embedding dataset.
+
+Parsing `accident-report-embeddings.json` takes seconds and the resulting
+Python lists use several times the memory of the raw floats. This module
+converts the JSON into a small versioned binary file that can be memory-mapped
+with zero copy, so several processes can share one page-cached copy.
+
+File layout (little-endian):
+    [0, 64)         Header: magic, format version, dtype code, number of rows,
+                    embedding dimension (zero padded to 64 bytes)
+    [64, ...)       Embedding matrix with shape [num_rows, dim]
+    [..., end)      int32 report ID column with shape [num_rows], aligned to
+                    8 bytes
+
+Usage:
+    python -m farsight.embedding_store accident-report-embeddings.json \\
+        accident-report-embeddings.bin [--dtype float16]
+"""
+
+import argparse
+import struct
+
+import numpy as np
+
+from farsight.retrieval import _load_json
+
+MAGIC = b"FSEMB\x00\x00\x00"
+FORMAT_VERSION = 1
+HEADER_SIZE = 64
+
+# <8s: magic, I: format version, I: dtype code, Q: number of rows, I: dimension
+_HEADER_STRUCT = struct.Struct("<8sIIQI")
+
+_DTYPE_CODES = {"float32": 0, "float16": 1}
+_CODE_DTYPES = {
+    code: np.dtype(name).newbyteorder("<") for name, code in _DTYPE_CODES.items()
+}
+
+
+def _align(offset, alignment=8):
+    """Round the offset up to a multiple of the alignment."""
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def write_embeddings(path, embeddings, report_ids, dtype="float32"):
+    """
+    Write embeddings and their report IDs into the binary format.
+
+    Args:
+        path(str): Output file path
+        embeddings(array-like): Report embeddings with shape [num_reports, dim]
+        report_ids(array-like): Accident report ID of each embedding row
+        dtype(str): Value of "float32" | "float16"
+    """
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(
+            "Unknown dtype: {}. Supported dtypes are {}.".format(
+                dtype, ", ".join(_DTYPE_CODES)
+            )
+        )
+
+    embeddings = np.ascontiguousarray(
+        embeddings, dtype=np.dtype(dtype).newbyteorder("<")
+    )
+    report_ids = np.ascontiguousarray(report_ids, dtype="<i4")
+
+    if embeddings.ndim != 2 or embeddings.shape[0] != report_ids.shape[0]:
+        raise ValueError("Embeddings must be a 2D matrix with one row per report ID.")
+
+    header = _HEADER_STRUCT.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        _DTYPE_CODES[dtype],
+        embeddings.shape[0],
+        embeddings.shape[1],
+    )
+    ids_offset = _align(HEADER_SIZE + embeddings.nbytes)
+
+    with open(path, "wb") as fp:
+        fp.write(header.ljust(HEADER_SIZE, b"\x00"))
+        fp.write(embeddings.tobytes())
+        fp.write(b"\x00" * (ids_offset - HEADER_SIZE - embeddings.nbytes))
+        fp.write(report_ids.tobytes())
+
+
+def read_header(path):
+    """
+    Read and validate the header of a binary embedding file.
+
+    Args:
+        path(str): Binary embedding file path
+
+    Return:
+        Dict with "version", "dtype", "num_rows", and "dim"
+    """
+    with open(path, "rb") as fp:
+        header = fp.read(HEADER_SIZE)
+
+    if len(header) < HEADER_SIZE or header[: len(MAGIC)] != MAGIC:
+        raise ValueError("{} is not a Farsight embedding file.".format(path))
+
+    _, version, dtype_code, num_rows, dim = _HEADER_STRUCT.unpack_from(header)
+
+    if version != FORMAT_VERSION:
+        raise ValueError(
+            "Unsupported embedding file version {} (expected {}).".format(
+                version, FORMAT_VERSION
+            )
+        )
+
+    if dtype_code not in _CODE_DTYPES:
+        raise ValueError("Unknown dtype code {} in {}.".format(dtype_code, path))
+
+    return {
+        "version": version,
+        "dtype": _CODE_DTYPES[dtype_code],
+        "num_rows": num_rows,
+        "dim": dim,
+    }
+
+
+def load_embeddings(path):
+    """
+    Memory-map a binary embedding file without copying it into memory.
+
+    Args:
+        path(str): Binary embedding file path
+
+    Return:
+        (embeddings, report_ids) read-only arrays backed by the file
+    """
+    header = read_header(path)
+    num_rows, dim = header["num_rows"], header["dim"]
+
+    embeddings = np.memmap(
+        path,
+        dtype=header["dtype"],
+        mode="r",
+        offset=HEADER_SIZE,
+        shape=(num_rows, dim),
+    )
+    report_ids = np.memmap(
+        path,
+        dtype="<i4",
+        mode="r",
+        offset=_align(HEADER_SIZE + embeddings.nbytes),
+        shape=(num_rows,),
+    )
+
+    return embeddings, report_ids
+
+
+def convert_json(json_path, output_path, dtype="float32"):
+    """
+    Convert accident-report-embeddings.json(.gzip) into the binary format.
+
+    Args:
+        json_path(str): Path to the `AccidentEmbeddingData` JSON file
+        output_path(str): Output binary file path
+        dtype(str): Value of "float32" | "float16"
+    """
+    data = _load_json(json_path)
+    write_embeddings(output_path, data["embeddings"], data["reportNumbers"], dtype)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert accident report embeddings JSON into a binary file."
+    )
+    parser.add_argument("json_path", help="accident-report-embeddings.json(.gzip)")
+    parser.add_argument("output_path", help="output binary file")
+    parser.add_argument("--dtype", choices=list(_DTYPE_CODES), default="float32")
+    args = parser.parse_args()
+
+    convert_json(args.json_path, args.output_path, args.dtype)
+
+
+if __name__ == "__main__":
+    main()
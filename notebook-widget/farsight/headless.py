@@ -0,0 +1,479 @@
+"""Headless harm envisioning without the browser UI.
+
+`envision_headless()` runs the same prompt templates as the Harm Envisioner
+(`prompt-summary.json`, `prompt-use-case.json`, `prompt-stakeholder.json`, and
+`prompt-harm.json`) and returns the use case -> stakeholder -> harm tree as
+data. Each model output is parsed while it streams, and the children of a node
+are expanded as soon as the node's closing tag arrives, so different branches
+of the tree are generated in parallel under one concurrency cap.
+
+Usage:
+    backend = GeminiTextGenBackend(api_key)
+    tree = farsight.envision_headless(prompt, backend, max_concurrency=8)
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from farsight import metrics
+from farsight.llm_cache import make_cache_key
+from farsight.tag_parser import parse_field, parse_stream, parse_tags
+from farsight.templates import fill_prompt, load_prompt
+
+USE_CASE_TAGS = ["intended", "highstakes", "misuse"]
+SEVERITY_LEVELS = {"not severe": 1, "severe": 2, "very severe": 3}
+RELEVANCE_LEVELS = {"relevant": 1, "very relevant": 2}
+
+
+class TextGenAPIError(Exception):
+    """Error returned by a text generation API."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class TextGenBackend:
+    """
+    Base class for text generation APIs. Subclasses implement `generate()`.
+    """
+
+    # Model name, used in cache keys
+    model = ""
+
+    def generate(self, prompt, temperature, stop_sequences=None):
+        """
+        Generate text and yield it chunk by chunk as it streams.
+
+        Args:
+            prompt(str): Compiled prompt
+            temperature(float): Model temperature
+            stop_sequences(list[str]?): Sequences that stop the generation
+
+        Return:
+            Iterator of text chunks
+        """
+        raise NotImplementedError
+
+
+class GeminiTextGenBackend(TextGenBackend):
+    """
+    Gemini API with server-sent event streaming (the same model and safety
+    settings as the text generation worker).
+    """
+
+    def __init__(self, api_key, model="gemini-pro", timeout=120):
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+
+    def generate(self, prompt, temperature, stop_sequences=None):
+        # Allow low-probability unsafe responses, like the text generation worker
+        safety_settings = [
+            {"category": category, "threshold": "BLOCK_ONLY_HIGH"}
+            for category in [
+                "HARM_CATEGORY_DANGEROUS_CONTENT",
+                "HARM_CATEGORY_HARASSMENT",
+                "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                "HARM_CATEGORY_HATE_SPEECH",
+            ]
+        ]
+        body = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "safetySettings": safety_settings,
+            "generationConfig": {
+                "temperature": temperature,
+                "stopSequences": stop_sequences or [],
+            },
+        }
+
+        url = "https://generativelanguage.googleapis.com/v1beta/models/{}:streamGenerateContent?{}".format(
+            self.model, urllib.parse.urlencode({"alt": "sse", "key": self.api_key})
+        )
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as error:
+            raise TextGenAPIError(
+                "Gemini API error {}: {}".format(
+                    error.code, error.read().decode("utf-8", "replace")
+                ),
+                status=error.code,
+            ) from error
+
+        with response:
+            for line in response:
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+
+                data = json.loads(line[len("data:") :])
+                if "candidates" not in data:
+                    raise TextGenAPIError("Gemini API is blocked: " + json.dumps(data))
+
+                for part in data["candidates"][0].get("content", {}).get("parts", []):
+                    yield part.get("text", "")
+
+
+class FakeTextGenBackend(TextGenBackend):
+    """
+    Deterministic offline backend for tests and dry runs. It recognizes which
+    Farsight prompt template it receives and streams a well-formed response
+    derived from a hash of the prompt.
+    """
+
+    model = "fake"
+
+    def __init__(self, chunk_size=16, delay=0.0):
+        """
+        Args:
+            chunk_size(int): Number of characters in each streamed chunk
+            delay(float): Seconds to wait before each chunk
+        """
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.num_calls = 0
+        self.lock = threading.Lock()
+
+    def _respond(self, prompt):
+        """Create a fake response for a compiled prompt."""
+        seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:6]
+
+        if prompt.endswith("</instruction>\n"):
+            return "<summary>Fake functionality {}.</summary>".format(seed)
+
+        if prompt.endswith("use cases:"):
+            return "\n".join(
+                "<{0}>Fake {0} use case {1} {2}.</{0}>".format(tag, i, seed)
+                for tag in USE_CASE_TAGS
+                for i in range(4)
+            )
+
+        if prompt.endswith("stakeholders: "):
+            return "<stakeholders>\n{}\n</stakeholders>".format(
+                "\n".join(
+                    '<stakeholder type="{}" relevance="{}">Fake {} stakeholder {} {}</stakeholder>'.format(
+                        kind, relevance, kind, i, seed
+                    )
+                    for kind in ["direct", "indirect"]
+                    for i, relevance in enumerate(
+                        ["very relevant", "relevant", "relevant", "very relevant"]
+                    )
+                )
+            )
+
+        if prompt.endswith("harms: "):
+            stakeholder = parse_field(
+                prompt[prompt.rfind("scenario:") :], "stakeholder"
+            )
+            return "\n".join(
+                "<harm>\n<explain>{} may face fake harm {} {}.</explain>\n"
+                "<type>{}</type>\n<severity>{}</severity>\n</harm>".format(
+                    stakeholder, i, seed, harm_type, severity
+                )
+                for i, (harm_type, severity) in enumerate(
+                    [
+                        ("Economic loss", "very severe"),
+                        ("Opportunity loss", "severe"),
+                        ("Diminished health and well-being", "not severe"),
+                    ]
+                )
+            )
+
+        return "Fake response {}".format(seed)
+
+    def generate(self, prompt, temperature, stop_sequences=None):
+        with self.lock:
+            self.num_calls += 1
+
+        text = self._respond(prompt)
+        for stop_sequence in stop_sequences or []:
+            if stop_sequence in text:
+                text = text[: text.index(stop_sequence)]
+
+        for i in range(0, len(text), self.chunk_size):
+            if self.delay > 0:
+                time.sleep(self.delay)
+            yield text[i : i + self.chunk_size]
+
+
+class _TaskGroup:
+    """
+    Run tasks on a shared thread pool, where tasks can add more tasks. `wait()`
+    returns after all tasks, including the ones added later, have finished.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.pending = 0
+        self.error = None
+        self.condition = threading.Condition()
+
+    def submit(self, fn, *args):
+        with self.condition:
+            if self.error is not None:
+                return
+            self.pending += 1
+        self.executor.submit(self._run, fn, *args)
+
+    def _run(self, fn, *args):
+        try:
+            fn(*args)
+        except BaseException as error:
+            with self.condition:
+                if self.error is None:
+                    self.error = error
+        finally:
+            with self.condition:
+                self.pending -= 1
+                self.condition.notify_all()
+
+    def wait(self):
+        with self.condition:
+            while self.pending > 0:
+                self.condition.wait()
+        if self.error is not None:
+            raise self.error
+
+
+class _HeadlessEnvisioner:
+    """
+    State of one headless envisioning run.
+    """
+
+    def __init__(
+        self,
+        backend,
+        cache,
+        temperature,
+        max_use_cases,
+        max_stakeholders,
+        max_harms,
+        on_harm,
+    ):
+        self.backend = backend
+        self.cache = cache
+        self.temperature = temperature
+        self.max_use_cases = max_use_cases
+        self.max_stakeholders = max_stakeholders
+        self.max_harms = max_harms
+        self.on_harm = on_harm
+
+    def stream_records(self, prompt_name, variables, tags):
+        """
+        Run a prompt template and yield its tagged records while it streams.
+
+        Args:
+            prompt_name(str): Prompt template name
+            variables(dict): Value of each prompt variable
+            tags(list[str]): Record tags to parse
+
+        Return:
+            Iterator of TagRecord
+        """
+        prompt = load_prompt(prompt_name)
+        temperature = (
+            prompt["temperature"] if self.temperature is None else self.temperature
+        )
+        stop_sequences = prompt.get("stopSequences")
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = make_cache_key(
+                prompt,
+                variables,
+                self.backend.model,
+                temperature,
+                stop_sequences=stop_sequences,
+            )
+            cached_text = self.cache.get(cache_key)
+            if cached_text is not None:
+                yield from parse_tags(cached_text, tags)
+                return
+
+        chunks = []
+
+        def record_chunks():
+            metrics.increment("llm_api_calls")
+            # Only time the backend, not the parsing and the work done by the
+            # caller between chunks
+            for chunk in metrics.timed_iter(
+                "llm_generation",
+                self.backend.generate(
+                    fill_prompt(prompt, variables), temperature, stop_sequences
+                ),
+                {"task": prompt_name},
+            ):
+                if cache_key is not None:
+                    chunks.append(chunk)
+                yield chunk
+
+        yield from parse_stream(record_chunks(), tags)
+
+        if cache_key is not None:
+            self.cache.set(cache_key, "".join(chunks))
+
+    def summarize(self, user_prompt):
+        """Summarize the user prompt into a functionality description."""
+        records = list(
+            self.stream_records("summary", {"userPrompt": user_prompt}, ["summary"])
+        )
+        if len(records) == 0:
+            raise TextGenAPIError("Failed to parse the prompt summary.")
+        return records[0].text
+
+    def expand_use_cases(self, tree, depth, tasks):
+        """Generate use cases and expand each one as soon as it is parsed."""
+        records = self.stream_records(
+            "use-case", {"functionality": tree["summary"]}, USE_CASE_TAGS
+        )
+        for record in records:
+            # After the limit, only keep reading the stream if the full output
+            # has to be cached
+            if len(tree["use_cases"]) == self.max_use_cases:
+                if self.cache is None:
+                    break
+                continue
+
+            # Skip a use case that is cut off by the token limit
+            if not record.complete:
+                continue
+
+            # Sometimes the model outputs nested tags, e.g., <intended><intended>
+            text = re.sub(r"<.+?>", "", record.text).strip()
+            use_case = {"text": text, "category": record.tag, "stakeholders": []}
+            tree["use_cases"].append(use_case)
+
+            if depth >= 2:
+                tasks.submit(self.expand_stakeholders, tree, use_case, depth, tasks)
+
+    def expand_stakeholders(self, tree, use_case, depth, tasks):
+        """Generate stakeholders of a use case and expand each one."""
+        variables = {"functionality": tree["summary"], "usecase": use_case["text"]}
+        for record in self.stream_records("stakeholder", variables, ["stakeholder"]):
+            if len(use_case["stakeholders"]) == self.max_stakeholders:
+                if self.cache is None:
+                    break
+                continue
+            if not record.complete:
+                continue
+
+            stakeholder = {
+                "text": record.text,
+                "category": record.attrs.get("type", "direct"),
+                "relevance": RELEVANCE_LEVELS.get(record.attrs.get("relevance"), 1),
+                "harms": [],
+            }
+            use_case["stakeholders"].append(stakeholder)
+
+            if depth >= 3:
+                tasks.submit(self.expand_harms, tree, use_case, stakeholder, tasks)
+
+    def expand_harms(self, tree, use_case, stakeholder, tasks):
+        """Generate harms of a stakeholder."""
+        variables = {
+            "functionality": tree["summary"],
+            "usecase": use_case["text"],
+            "stakeholder": stakeholder["text"],
+        }
+        for record in self.stream_records("harm", variables, ["harm"]):
+            if len(stakeholder["harms"]) == self.max_harms:
+                if self.cache is None:
+                    break
+                continue
+
+            # A harm cut off by the token limit is still useful if it has its
+            # explanation, and its severity defaults to "severe"
+            explain = parse_field(record.text, "explain")
+            if explain is None:
+                continue
+
+            severity = parse_field(record.text, "severity")
+            harm = {
+                "text": explain,
+                "type": parse_field(record.text, "type"),
+                "severity": SEVERITY_LEVELS.get(severity, 2),
+            }
+            stakeholder["harms"].append(harm)
+
+            if self.on_harm is not None:
+                tasks.submit(self.on_harm, harm, stakeholder, use_case)
+
+
+def envision_headless(
+    prompt,
+    backend,
+    summary=None,
+    depth=3,
+    max_use_cases=None,
+    max_stakeholders=None,
+    max_harms=None,
+    max_concurrency=8,
+    temperature=None,
+    cache=None,
+    on_harm=None,
+):
+    """
+    Envision the use cases, stakeholders, and harms of a prompt without the UI.
+
+    Args:
+        prompt(str): Current prompt for an AI feature
+        backend(TextGenBackend): Text generation API, e.g.,
+            GeminiTextGenBackend or FakeTextGenBackend
+        summary(str?): Functionality summary of the prompt. If None, it is
+            generated with prompt-summary.json
+        depth(int): Levels to generate, 1: use cases, 2: + stakeholders,
+            3: + harms
+        max_use_cases(int?): Maximal number of use cases, default no limit
+        max_stakeholders(int?): Maximal number of stakeholders per use case
+        max_harms(int?): Maximal number of harms per stakeholder
+        max_concurrency(int): Maximal number of concurrent model calls
+        temperature(float?): Model temperature, default the template's value
+        cache(LLMCache?): Cache for model outputs
+        on_harm(callable?): Function called with (harm, stakeholder, use_case)
+            as soon as each harm is parsed, e.g., to retrieve relevant
+            accidents while other harms are still being generated. It runs on
+            the engine's thread pool and counts toward max_concurrency.
+
+    Return:
+        Dict tree {"prompt", "summary", "use_cases": [{"text", "category",
+        "stakeholders": [{"text", "category", "relevance", "harms": [{"text",
+        "type", "severity"}]}]}]}
+    """
+    if depth not in [1, 2, 3]:
+        raise ValueError("depth must be 1, 2, or 3.")
+
+    envisioner = _HeadlessEnvisioner(
+        backend,
+        cache,
+        temperature,
+        max_use_cases,
+        max_stakeholders,
+        max_harms,
+        on_harm,
+    )
+
+    if summary is None:
+        summary = envisioner.summarize(prompt)
+
+    tree = {"prompt": prompt, "summary": summary, "use_cases": []}
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        tasks = _TaskGroup(executor)
+        tasks.submit(envisioner.expand_use_cases, tree, depth, tasks)
+        tasks.wait()
+
+    return tree
@@ -0,0 +1,275 @@
+"""Persistent, content-addressed cache for LLM generations and embeddings.
+
+Entries are stored in SQLite and keyed on a hash of everything that affects the
+model output: the prompt template, the filled variables, the model, and the
+temperature (plus any extra request parameters). The cache supports size- and
+TTL-based eviction and keeps hit/miss counters.
+
+Usage:
+    cache = LLMCache("farsight-cache.sqlite", max_entries=100000, ttl=7 * 86400)
+    prompt = load_prompt("harm")
+    key = make_cache_key(prompt, variables, model="gemini-pro", temperature=0.1)
+    result = cache.get_or_compute(key, lambda: generate(fill_prompt(prompt, variables)))
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from farsight import metrics
+
+_MISSING = object()
+
+
+def make_cache_key(prompt, variables, model, temperature, kind="generation", **params):
+    """
+    Create a content-addressed cache key.
+
+    Args:
+        prompt(dict | str): Prompt template from load_prompt(), or a raw prompt
+        variables(dict): Value of each prompt variable
+        model(str): Model name
+        temperature(float): Model temperature
+        kind(str): Value of "generation" | "embedding"
+        params: Other request parameters that change the output (e.g.,
+            stop_sequences)
+
+    Return:
+        SHA-256 hex digest of the request
+    """
+    template = prompt["prompt"] if isinstance(prompt, dict) else prompt
+    request = {
+        "kind": kind,
+        "template": hashlib.sha256(template.encode("utf-8")).hexdigest(),
+        "variables": variables,
+        "model": model,
+        "temperature": float(temperature),
+        "params": params,
+    }
+    request_json = json.dumps(request, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(request_json.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite-backed cache with LRU size eviction and TTL expiration. The cache is
+    safe to share across threads.
+    """
+
+    def __init__(self, path=":memory:", max_entries=None, max_bytes=None, ttl=None):
+        """
+        Args:
+            path(str): SQLite database path, default an in-memory database
+            max_entries(int?): Maximal number of entries, default no limit
+            max_bytes(int?): Maximal total size of cached values, default no
+                limit
+            ttl(float?): Seconds before an entry expires, default never
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            # WAL without a sync on every commit keeps cache hits fast
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_created_at ON entries (created_at)"
+            )
+
+        # Number and total size of the entries, kept up to date by this object
+        # so set() does not need to scan the table to check the limits
+        self._num_entries, self._total_size = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+
+    def _is_expired(self, created_at, now):
+        """Check if an entry created at the given time has expired."""
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get(self, key, default=None):
+        """
+        Get a cached value.
+
+        Args:
+            key(str): Cache key from make_cache_key()
+            default: Value to return on a miss
+
+        Return:
+            The cached value, or default
+        """
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value, created_at, size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or self._is_expired(row[1], now):
+                if row is not None:
+                    with self.connection:
+                        self.connection.execute(
+                            "DELETE FROM entries WHERE key = ?", (key,)
+                        )
+                    self._num_entries -= 1
+                    self._total_size -= row[2]
+                    self.evictions += 1
+                self.misses += 1
+                metrics.increment("llm_cache_misses")
+                return default
+
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+            self.hits += 1
+            metrics.increment("llm_cache_hits")
+
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """
+        Cache a JSON-serializable value, evicting old entries if needed.
+
+        Args:
+            key(str): Cache key from make_cache_key()
+            value: Generated text, embedding, or other JSON-serializable value
+        """
+        value_json = json.dumps(value)
+        now = time.time()
+
+        with self.lock, self.connection:
+            old = self.connection.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, value_json, len(value_json), now, now),
+            )
+            if old is None:
+                self._num_entries += 1
+            else:
+                self._total_size -= old[0]
+            self._total_size += len(value_json)
+            self._evict(now)
+
+    def get_or_compute(self, key, compute):
+        """
+        Get a cached value, or compute and cache it on a miss.
+
+        Args:
+            key(str): Cache key from make_cache_key()
+            compute(callable): Function with no arguments that returns the value
+
+        Return:
+            The cached or computed value
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def _evict(self, now):
+        """
+        Remove expired entries, then least recently used ones over the limits.
+        Entries accessed at the same time (e.g., with a coarse clock) are
+        ordered by insertion, so the newest entry is kept. Both steps only read
+        the entries they remove, through the indices.
+        """
+        cursor = self.connection.cursor()
+
+        if self.ttl is not None:
+            num_expired, expired_size = cursor.execute(
+                """SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries
+                WHERE created_at < ?""",
+                (now - self.ttl,),
+            ).fetchone()
+            if num_expired > 0:
+                cursor.execute(
+                    "DELETE FROM entries WHERE created_at < ?", (now - self.ttl,)
+                )
+                self._num_entries -= num_expired
+                self._total_size -= expired_size
+                self.evictions += num_expired
+
+        num_over = 0
+        if self.max_entries is not None:
+            num_over = max(0, self._num_entries - self.max_entries)
+        size_over = 0
+        if self.max_bytes is not None:
+            size_over = max(0, self._total_size - self.max_bytes)
+        if num_over == 0 and size_over == 0:
+            return
+
+        # Remove the least recently used entries until both limits hold
+        evicted = []
+        evicted_size = 0
+        for key, size in cursor.execute(
+            "SELECT key, size FROM entries ORDER BY accessed_at, rowid"
+        ):
+            if len(evicted) >= num_over and evicted_size >= size_over:
+                break
+            evicted.append((key,))
+            evicted_size += size
+
+        cursor.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self._num_entries -= len(evicted)
+        self._total_size -= evicted_size
+        self.evictions += len(evicted)
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM entries")
+            self._num_entries = 0
+            self._total_size = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Return:
+            Dict with "hits", "misses", "evictions", "entries", and "bytes"
+        """
+        with self.lock:
+            entries, total_size = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total_size,
+        }
+
+    def close(self):
+        """Close the database connection."""
+        self.connection.close()
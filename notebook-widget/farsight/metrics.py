@@ -0,0 +1,375 @@
+"""Opt-in instrumentation for Farsight's hot paths.
+
+Farsight times its main stages with `span()` (or `timer()` and `timed_iter()`
+for stages that run in pieces, such as streaming) and counts events (cache
+hits, API calls) with `increment()`. They are no-ops until `enable_metrics()`
+is called, so the disabled cost is one global check per call.
+
+Stages: "bundle_encoding", "html_escaping", "embedding_call",
+"similarity_scoring", "llm_generation", and "tag_parsing".
+
+Usage:
+    farsight.metrics.enable_metrics()
+    tree = farsight.envision_headless(prompt, backend)
+    print(farsight.metrics.get_metrics())
+    farsight.metrics.write_prometheus("/var/lib/node_exporter/farsight.prom")
+
+    # Send spans to OpenTelemetry
+    tracer = opentelemetry.trace.get_tracer("farsight")
+    farsight.metrics.enable_metrics(farsight.metrics.opentelemetry_callback(tracer))
+"""
+
+import bisect
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+HISTOGRAM_BUCKETS = [
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    float("inf"),
+]
+
+_ENABLED = False
+_LOCK = threading.Lock()
+_COUNTERS = {}
+_HISTOGRAMS = {}
+_CALLBACKS = []
+
+
+class _NoopSpan:
+    """Span returned while metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def finish(self):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _wall_time_ns():
+    """Get the wall clock time in nanoseconds (`time.time_ns()` needs 3.7)."""
+    return int(time.time() * 1e9)
+
+
+def _record(name, start_ns, duration, attributes, error):
+    """Record a finished span in the histograms and pass it to the callbacks."""
+    _observe(name, duration)
+    if error is not None:
+        increment("{}_errors".format(name))
+
+    end_ns = start_ns + int(duration * 1e9)
+    for callback in _CALLBACKS:
+        callback(name, start_ns, end_ns, attributes, error)
+
+
+class _Span:
+    """Timed span that records its duration when it exits."""
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = None
+
+    def __enter__(self):
+        self.start_ns = _wall_time_ns()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self._start
+
+        # A generator that is closed early exits with GeneratorExit, which is
+        # not an error
+        error = exc_value if isinstance(exc_value, Exception) else None
+        _record(self.name, self.start_ns, duration, self.attributes, error)
+        return False
+
+
+class _Timer:
+    """
+    Span that adds up the time spent in its `with` blocks and is recorded once
+    by `finish()`.
+    """
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self._reset()
+
+    def _reset(self):
+        self.start_ns = None
+        self.duration = 0.0
+        self.error = None
+
+    def __enter__(self):
+        if self.start_ns is None:
+            self.start_ns = _wall_time_ns()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration += time.perf_counter() - self._start
+        if isinstance(exc_value, Exception):
+            self.error = exc_value
+        return False
+
+    def finish(self):
+        """Record the span if it was entered, and start over."""
+        if self.start_ns is not None:
+            _record(
+                self.name, self.start_ns, self.duration, self.attributes, self.error
+            )
+        self._reset()
+
+
+def enable_metrics(callback=None):
+    """
+    Start collecting metrics.
+
+    Args:
+        callback(callable?): Function called with (name, start_time_ns,
+            end_time_ns, attributes, error) after each span, e.g., from
+            opentelemetry_callback()
+    """
+    global _ENABLED
+    if callback is not None:
+        _CALLBACKS.append(callback)
+    _ENABLED = True
+
+
+def disable_metrics():
+    """Stop collecting metrics and remove the span callbacks."""
+    global _ENABLED
+    _ENABLED = False
+    _CALLBACKS.clear()
+
+
+def is_enabled():
+    """Check if metrics are being collected."""
+    return _ENABLED
+
+
+def reset_metrics():
+    """Clear all collected counters and histograms."""
+    with _LOCK:
+        _COUNTERS.clear()
+        _HISTOGRAMS.clear()
+
+
+def span(name, attributes=None):
+    """
+    Time a stage.
+
+    Args:
+        name(str): Stage name, e.g., "similarity_scoring"
+        attributes(dict?): Extra attributes passed to the span callbacks
+
+    Return:
+        Context manager
+    """
+    if not _ENABLED:
+        return _NOOP_SPAN
+    return _Span(name, attributes or {})
+
+
+def timer(name, attributes=None):
+    """
+    Time a stage that runs in pieces, e.g., parsing a stream chunk by chunk.
+    Only the time inside the timer's `with` blocks is counted, and the stage
+    is recorded once when `finish()` is called. The span passed to the
+    callbacks starts at the first block and lasts the counted time.
+
+    Args:
+        name(str): Stage name, e.g., "tag_parsing"
+        attributes(dict?): Extra attributes passed to the span callbacks
+
+    Return:
+        Context manager with a `finish()` method
+    """
+    if not _ENABLED:
+        return _NOOP_SPAN
+    return _Timer(name, attributes or {})
+
+
+def timed_iter(name, iterable, attributes=None):
+    """
+    Time the production of an iterable's items, e.g., a streaming API
+    response. The time spent by the consumer between items is not counted.
+
+    Args:
+        name(str): Stage name, e.g., "llm_generation"
+        iterable(iterable): Items to time
+        attributes(dict?): Extra attributes passed to the span callbacks
+
+    Return:
+        Iterator of the same items
+    """
+    stage_timer = timer(name, attributes)
+    try:
+        with stage_timer:
+            iterator = iter(iterable)
+        while True:
+            with stage_timer:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        stage_timer.finish()
+
+
+def increment(name, value=1):
+    """
+    Increase a counter.
+
+    Args:
+        name(str): Counter name, e.g., "llm_cache_hits"
+        value(int): Amount to add
+    """
+    if not _ENABLED:
+        return
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + value
+
+
+def _observe(name, duration):
+    """Add a duration (seconds) to the stage's latency histogram."""
+    with _LOCK:
+        histogram = _HISTOGRAMS.get(name)
+        if histogram is None:
+            histogram = {
+                "count": 0,
+                "sum": 0.0,
+                "buckets": [0] * len(HISTOGRAM_BUCKETS),
+            }
+            _HISTOGRAMS[name] = histogram
+
+        histogram["count"] += 1
+        histogram["sum"] += duration
+        histogram["buckets"][bisect.bisect_left(HISTOGRAM_BUCKETS, duration)] += 1
+
+
+def get_metrics():
+    """
+    Get a snapshot of the collected metrics.
+
+    Return:
+        Dict {"counters": {name: value}, "histograms": {stage: {"count",
+        "sum", "buckets": {upper_bound: count}}}}. Bucket counts are not
+        cumulative.
+    """
+    with _LOCK:
+        return {
+            "counters": dict(_COUNTERS),
+            "histograms": {
+                name: {
+                    "count": histogram["count"],
+                    "sum": histogram["sum"],
+                    "buckets": dict(zip(HISTOGRAM_BUCKETS, histogram["buckets"])),
+                }
+                for name, histogram in _HISTOGRAMS.items()
+            },
+        }
+
+
+def _format_bound(bound):
+    """Format a bucket bound as a Prometheus `le` label."""
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def to_prometheus(prefix="farsight"):
+    """
+    Export the metrics in the Prometheus text exposition format.
+
+    Args:
+        prefix(str): Prefix of the metric names
+
+    Return:
+        Prometheus text
+    """
+    metrics = get_metrics()
+    lines = []
+
+    for name, value in sorted(metrics["counters"].items()):
+        metric = "{}_{}_total".format(prefix, name)
+        lines.append("# TYPE {} counter".format(metric))
+        lines.append("{} {}".format(metric, value))
+
+    if len(metrics["histograms"]) > 0:
+        metric = "{}_stage_duration_seconds".format(prefix)
+        lines.append("# TYPE {} histogram".format(metric))
+
+        for name, histogram in sorted(metrics["histograms"].items()):
+            cumulative = 0
+            for bound, count in histogram["buckets"].items():
+                cumulative += count
+                lines.append(
+                    '{}_bucket{{stage="{}",le="{}"}} {}'.format(
+                        metric, name, _format_bound(bound), cumulative
+                    )
+                )
+            lines.append(
+                '{}_sum{{stage="{}"}} {}'.format(metric, name, histogram["sum"])
+            )
+            lines.append(
+                '{}_count{{stage="{}"}} {}'.format(metric, name, histogram["count"])
+            )
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path, prefix="farsight"):
+    """
+    Write the metrics to a Prometheus text file (e.g., for the node exporter's
+    textfile collector). The file is replaced atomically.
+
+    Args:
+        path(str): Output path, usually ending with .prom
+        prefix(str): Prefix of the metric names
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf8") as fp:
+        fp.write(to_prometheus(prefix))
+    os.replace(temp_path, path)
+
+
+def opentelemetry_callback(tracer):
+    """
+    Create a span callback that reports spans to OpenTelemetry.
+
+    Args:
+        tracer(opentelemetry.trace.Tracer): Tracer to create spans with
+
+    Return:
+        Callback for enable_metrics()
+    """
+
+    def callback(name, start_ns, end_ns, attributes, error):
+        otel_span = tracer.start_span(
+            "farsight.{}".format(name), start_time=start_ns, attributes=attributes
+        )
+        if error is not None:
+            otel_span.record_exception(error)
+        otel_span.end(end_time=end_ns)
+
+    return callback
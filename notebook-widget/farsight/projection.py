@@ -0,0 +1,333 @@
+"""Place new embeddings on a precomputed 2D map and update WizMap files.
+
+`incident-embedding.ipynb` fits UMAP on all accident report embeddings and
+calls `model.transform()` on new prompts, then regenerates the WizMap
+`data.ndjson` and `grid.json`. `KNNProjector` stores the fitted 2D coordinates
+and places each new embedding at the mean of its k nearest reference points,
+weighted by the inverse squared distance between the unit-normalized
+embeddings.
+`append_to_wizmap()` appends the new points to existing WizMap files and
+updates the density grids in place, without rerunning the KDE or the topic
+extraction over the whole map.
+
+Usage:
+    projector = KNNProjector.from_umap(model, embedding_data)
+    projector.save("./data/ai-incident-projection")
+    xs, ys = projector.transform(prompt_embeddings).T
+    append_to_wizmap("./data/ai-incident", xs, ys, prompts, labels=[1] * len(prompts))
+"""
+
+import json
+import os
+
+import numpy as np
+
+from farsight.ann import _normalize
+from farsight.retrieval import _top_k
+
+FORMAT_VERSION = 1
+_ARRAY_NAMES = ["embeddings", "coordinates"]
+
+
+class KNNProjector:
+    """
+    Project embeddings to 2D by k-nearest-neighbor placement against a
+    precomputed projection (e.g., a fitted UMAP).
+    """
+
+    def __init__(self, embeddings, coordinates, k=15):
+        """
+        Args:
+            embeddings(array-like): Reference embeddings with shape [num_points, dim]
+            coordinates(array-like): 2D coordinates of the reference embeddings
+                with shape [num_points, 2]
+            k(int): Number of nearest reference points used to place a point
+        """
+        self.embeddings = _normalize(np.asarray(embeddings, dtype=np.float32))
+        self.coordinates = np.asarray(coordinates, dtype=np.float32)
+        self.k = k
+
+        if self.coordinates.shape != (self.embeddings.shape[0], 2):
+            raise ValueError(
+                "coordinates must have shape [{}, 2], got {}.".format(
+                    self.embeddings.shape[0], list(self.coordinates.shape)
+                )
+            )
+
+    @classmethod
+    def from_umap(cls, model, embeddings=None, k=None):
+        """
+        Create a projector from a fitted `umap.UMAP` model.
+
+        Args:
+            model(umap.UMAP): Fitted UMAP model
+            embeddings(array-like?): Embeddings the model was fitted on,
+                default the model's own copy of its training data
+            k(int?): Number of neighbors, default the model's n_neighbors
+
+        Return:
+            KNNProjector
+        """
+        if embeddings is None:
+            embeddings = model._raw_data
+        if k is None:
+            k = model.n_neighbors
+        return cls(embeddings, model.embedding_, k)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a projector saved by `KNNProjector.save()`.
+
+        Args:
+            path(str): Projector directory
+            mmap(bool): Memory-map the arrays instead of reading them
+
+        Return:
+            KNNProjector
+        """
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf8") as fp:
+            meta = json.load(fp)
+
+        if meta["version"] != FORMAT_VERSION:
+            raise ValueError(
+                "Unsupported projector version {} (expected {}).".format(
+                    meta["version"], FORMAT_VERSION
+                )
+            )
+
+        arrays = {
+            name: np.load(
+                os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None
+            )
+            for name in _ARRAY_NAMES
+        }
+        return cls(k=meta["k"], **arrays)
+
+    def save(self, path):
+        """
+        Save the projector into a directory of .npy files.
+
+        Args:
+            path(str): Projector directory, created if it does not exist
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAY_NAMES:
+            np.save(os.path.join(path, name + ".npy"), getattr(self, name))
+
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf8") as fp:
+            json.dump({"version": FORMAT_VERSION, "k": self.k}, fp)
+
+    def __len__(self):
+        return self.embeddings.shape[0]
+
+    def transform(self, embeddings, batch_size=1024):
+        """
+        Place new embeddings on the 2D map.
+
+        Args:
+            embeddings(array-like): Embeddings with shape [num_points, dim]
+            batch_size(int): Number of embeddings scored together
+
+        Return:
+            np.ndarray of 2D coordinates with shape [num_points, 2]
+        """
+        queries = _normalize(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        coordinates = np.empty((queries.shape[0], 2), dtype=np.float32)
+
+        for start in range(0, queries.shape[0], batch_size):
+            batch = queries[start : start + batch_size]
+            indices, scores = _top_k(batch @ self.embeddings.T, self.k)
+
+            # Weigh neighbors by inverse squared distance between unit vectors,
+            # so a point identical to a reference point lands on it
+            weights = 1 / (np.maximum(2 - 2 * scores, 0) + 1e-12)
+            weights /= weights.sum(axis=1, keepdims=True)
+
+            coordinates[start : start + batch_size] = np.einsum(
+                "nk,nkd->nd", weights, self.coordinates[indices]
+            )
+
+        return coordinates
+
+
+def _kde_grid(xs, ys, x_range, y_range, grid_size, bandwidth):
+    """
+    Sum Gaussian kernels of points on a WizMap density grid.
+
+    Args:
+        xs(np.ndarray): X coordinates of points
+        ys(np.ndarray): Y coordinates of points
+        x_range(list[float]): [x_min, x_max] of the grid
+        y_range(list[float]): [y_min, y_max] of the grid
+        grid_size(int): Number of grid cells in each dimension
+        bandwidth(float): Kernel bandwidth
+
+    Return:
+        np.ndarray with shape [grid_size, grid_size], indexed by [y, x] like
+        WizMap's grids
+    """
+    grid_xs = np.linspace(x_range[0], x_range[1], grid_size)
+    grid_ys = np.linspace(y_range[0], y_range[1], grid_size)
+
+    # The 2D Gaussian kernel is separable, so the sum is a matrix product
+    kernel_xs = np.exp(-((grid_xs[None, :] - xs[:, None]) ** 2) / (2 * bandwidth**2))
+    kernel_ys = np.exp(-((grid_ys[None, :] - ys[:, None]) ** 2) / (2 * bandwidth**2))
+    return (kernel_ys.T @ kernel_xs) / (2 * np.pi * bandwidth**2)
+
+
+def _bandwidth(sample_size):
+    """Silverman's rule for 2D data, the same as WizMap."""
+    return (sample_size * (2 + 2) / 4.0) ** (-1.0 / (2 + 4))
+
+
+def _merge_grid(grid, total, xs, ys, grid_dict, grid_size, sample_size):
+    """
+    Add points to a density grid of `total` points.
+
+    Return:
+        Updated grid as nested lists, rounded like WizMap's grids
+    """
+    new_density = _kde_grid(
+        xs,
+        ys,
+        grid_dict["xRange"],
+        grid_dict["yRange"],
+        grid_size,
+        _bandwidth(sample_size),
+    )
+    merged = (np.asarray(grid, dtype=np.float64) * total + new_density) / (
+        total + xs.shape[0]
+    )
+    return merged.round(4).tolist()
+
+
+def append_to_wizmap(
+    output_dir,
+    xs,
+    ys,
+    texts,
+    labels=None,
+    times=None,
+    data_json_name="data.ndjson",
+    grid_json_name="grid.json",
+):
+    """
+    Append points to WizMap files created by `wizmap.save_json_files()`.
+
+    New rows are appended to the data file, and the density grids in the grid
+    file are updated as the count-weighted mix of the existing density and the
+    new points' density (with the bandwidth of the existing map). The grid
+    ranges and the topics are kept.
+
+    Args:
+        output_dir(str): Folder of the WizMap json files
+        xs(array-like): X coordinates of new points
+        ys(array-like): Y coordinates of new points
+        texts(list[str]): Documents associated with new points
+        labels(list[int]?): Category label of each point, an index into the
+            map's groupNames. Required if the map has group grids.
+        times(list[str]?): Time of each point. Required if the map has time
+            grids.
+        data_json_name(str): Filename of the data file
+        grid_json_name(str): Filename of the grid file
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    if not (xs.shape[0] == ys.shape[0] == len(texts)):
+        raise ValueError("xs, ys, and texts must have the same length.")
+    if xs.shape[0] == 0:
+        return
+
+    grid_path = os.path.join(output_dir, grid_json_name)
+    with open(grid_path, "r", encoding="utf8") as fp:
+        grid_dict = json.load(fp)
+
+    group_names = grid_dict.get("groupNames")
+    if "groupGrids" in grid_dict and labels is None:
+        raise ValueError("labels are required to update a map with groups.")
+    if "timeGrids" in grid_dict and times is None:
+        raise ValueError("times are required to update a map with times.")
+    if labels is not None and group_names is not None:
+        for label in labels:
+            if not 0 <= label < len(group_names):
+                raise ValueError(
+                    "Unknown label: {}. Supported labels are 0 to {}.".format(
+                        label, len(group_names) - 1
+                    )
+                )
+
+    # Update the density grids
+    grid_size = len(grid_dict["grid"])
+    total = grid_dict["totalPointSize"]
+    grid_dict["grid"] = _merge_grid(
+        grid_dict["grid"], total, xs, ys, grid_dict, grid_size, grid_dict["sampleSize"]
+    )
+    grid_dict["totalPointSize"] = total + xs.shape[0]
+    if grid_dict["sampleSize"] == total:
+        grid_dict["sampleSize"] = total + xs.shape[0]
+
+    if "groupGrids" in grid_dict:
+        labels_np = np.asarray(labels)
+        for label, name in enumerate(group_names):
+            mask = labels_np == label
+            if not mask.any():
+                continue
+            group_total = grid_dict["groupTotalPointSizes"][name]
+            grid_dict["groupGrids"][name] = _merge_grid(
+                grid_dict["groupGrids"][name],
+                group_total,
+                xs[mask],
+                ys[mask],
+                grid_dict,
+                grid_size,
+                group_total,
+            )
+            grid_dict["groupTotalPointSizes"][name] = group_total + int(mask.sum())
+
+    if "timeGrids" in grid_dict:
+        times_np = np.asarray(times)
+        for cur_time in sorted(set(times)):
+            mask = times_np == cur_time
+            time_total = grid_dict["timeCounter"].get(cur_time, 0)
+            time_grid = grid_dict["timeGrids"].get(
+                cur_time, np.zeros((grid_size, grid_size))
+            )
+            grid_dict["timeGrids"][cur_time] = _merge_grid(
+                time_grid,
+                time_total,
+                xs[mask],
+                ys[mask],
+                grid_dict,
+                grid_size,
+                max(time_total, int(mask.sum())),
+            )
+            grid_dict["timeCounter"][cur_time] = time_total + int(mask.sum())
+
+    # Append the data rows in the same layout as `wizmap.generate_data_list()`
+    data_path = os.path.join(output_dir, data_json_name)
+    needs_newline = False
+    if os.path.exists(data_path) and os.path.getsize(data_path) > 0:
+        with open(data_path, "rb") as fp:
+            fp.seek(-1, os.SEEK_END)
+            needs_newline = fp.read(1) != b"\n"
+
+    with open(data_path, "a", encoding="utf8") as fp:
+        if needs_newline:
+            fp.write("\n")
+        for i in range(xs.shape[0]):
+            row = [float(xs[i]), float(ys[i]), texts[i]]
+            if times is not None:
+                row.append(times[i])
+            elif labels is not None:
+                row.append("")
+            if labels is not None:
+                row.append(int(labels[i]))
+            fp.write(json.dumps(row))
+            fp.write("\n")
+
+    # Replace the grid file atomically so readers never see a partial file
+    temp_path = grid_path + ".tmp"
+    with open(temp_path, "w", encoding="utf8") as fp:
+        json.dump(grid_dict, fp)
+    os.replace(temp_path, grid_path)
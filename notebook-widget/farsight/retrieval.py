@@ -0,0 +1,212 @@
+"""Offline similarity search over AI accident report embeddings.
+
+This module mirrors `startQueryAccidents()` in `src/workers/text-emb-worker.ts`
+so that we can find relevant accident reports for many prompts in Python.
+"""
+
+import gzip
+import json
+
+import numpy as np
+
+from farsight import metrics
+
+EMBEDDING_SIZE = 768
+MAX_RELEVANT_ACCIDENT_SIZE = 300
+MIN_SCORE = 0.6
+
+
+def _load_json(path):
+    """
+    Load a JSON file, decompressing it first if it is gzipped.
+
+    Args:
+        path(str): Path to a .json or a gzipped .json.gzip / .json.gz file
+
+    Return:
+        Parsed JSON data
+    """
+    if path.endswith(".gzip") or path.endswith(".gz"):
+        with gzip.open(path, "rt", encoding="utf8") as fp:
+            return json.load(fp)
+
+    with open(path, "r", encoding="utf8") as fp:
+        return json.load(fp)
+
+
+def _top_k(scores, k):
+    """
+    Find the k highest scores in each row without sorting the full rows.
+
+    Args:
+        scores(np.ndarray): Similarity scores with shape [num_queries, num_reports]
+        k(int): Number of top scores to keep in each row
+
+    Return:
+        (indices, scores) with shape [num_queries, k], sorted by descending
+        score. Ties are broken by the lower report index, like the stable sort
+        in the JS worker.
+    """
+    num_reports = scores.shape[1]
+    k = min(k, num_reports)
+
+    if k < num_reports:
+        indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.broadcast_to(np.arange(num_reports), scores.shape).copy()
+
+    top_scores = np.take_along_axis(scores, indices, axis=1)
+    order = np.lexsort((indices, -top_scores), axis=-1)
+
+    return (
+        np.take_along_axis(indices, order, axis=1),
+        np.take_along_axis(top_scores, order, axis=1),
+    )
+
+
+def _to_relevant_accidents(report_ids, indices, scores, min_score):
+    """
+    Convert top-k results of one query into `RelevantAccident` dicts.
+
+    Args:
+        report_ids(np.ndarray): Accident report IDs of all reports
+        indices(np.ndarray): Top report indices sorted by descending score
+        scores(np.ndarray): Scores of the top reports
+        min_score(float): Minimal similarity score to keep a report
+
+    Return:
+        List of {"accidentReportID", "similarity"} dicts
+    """
+    keep = scores >= min_score
+    return [
+        {"accidentReportID": int(report_id), "similarity": round(float(score), 6)}
+        for report_id, score in zip(report_ids[indices[keep]], scores[keep])
+    ]
+
+
+class AccidentIndex:
+    """
+    Exact (brute-force) similarity search over accident report embeddings.
+
+    Embeddings are stored in one contiguous float32 matrix, and a batch of
+    queries is scored with one matrix multiplication. The similarity score is
+    a dot product, because the embeddings have been normalized.
+    """
+
+    def __init__(self, embeddings, report_ids):
+        """
+        Args:
+            embeddings(array-like): Report embeddings with shape [num_reports, dim]
+            report_ids(array-like): Accident report ID of each embedding row
+        """
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.report_ids = np.asarray(report_ids)
+
+        if self.embeddings.ndim != 2:
+            raise ValueError("Embeddings must be a 2D matrix.")
+
+        if self.embeddings.shape[0] != self.report_ids.shape[0]:
+            raise ValueError(
+                "Got {} embeddings but {} report IDs.".format(
+                    self.embeddings.shape[0], self.report_ids.shape[0]
+                )
+            )
+
+    @classmethod
+    def from_json(cls, path):
+        """
+        Load the index from an accident embedding JSON file (the
+        `AccidentEmbeddingData` format used by the JS worker).
+
+        Args:
+            path(str): Path to accident-report-embeddings.json(.gzip)
+
+        Return:
+            AccidentIndex
+        """
+        data = _load_json(path)
+        return cls(data["embeddings"], data["reportNumbers"])
+
+    @classmethod
+    def from_binary(cls, path):
+        """
+        Load the index from a binary embedding file (see
+        `farsight.embedding_store`). float32 files are memory-mapped with zero
+        copy, so several processes can share one page-cached copy.
+
+        Args:
+            path(str): Path to a binary embedding file
+
+        Return:
+            AccidentIndex
+        """
+        from farsight.embedding_store import load_embeddings
+
+        embeddings, report_ids = load_embeddings(path)
+        return cls(embeddings, report_ids)
+
+    def __len__(self):
+        return self.embeddings.shape[0]
+
+    def top_k(self, query_embeddings, k=MAX_RELEVANT_ACCIDENT_SIZE, batch_size=1024):
+        """
+        Find the top k most similar reports for a batch of query embeddings.
+
+        Args:
+            query_embeddings(array-like): Queries with shape [num_queries, dim]
+            k(int): Number of reports to return for each query
+            batch_size(int): Number of queries scored together, which bounds
+                the memory of the [batch_size, num_reports] score matrix
+
+        Return:
+            (indices, scores) arrays with shape [num_queries, k], sorted by
+            descending score
+        """
+        queries = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        queries = np.atleast_2d(queries)
+
+        all_indices, all_scores = [], []
+        with metrics.span("similarity_scoring"):
+            for start in range(0, queries.shape[0], batch_size):
+                scores = queries[start : start + batch_size] @ self.embeddings.T
+                indices, scores = _top_k(scores, k)
+                all_indices.append(indices)
+                all_scores.append(scores)
+
+        if len(all_indices) == 0:
+            k = min(k, len(self))
+            return np.empty((0, k), dtype=np.int64), np.empty((0, k), np.float32)
+
+        return np.concatenate(all_indices), np.concatenate(all_scores)
+
+    def query(
+        self,
+        query_embeddings,
+        min_score=MIN_SCORE,
+        k=MAX_RELEVANT_ACCIDENT_SIZE,
+        batch_size=1024,
+    ):
+        """
+        Find relevant accident reports for one or many query embeddings.
+
+        Args:
+            query_embeddings(array-like): One query with shape [dim], or a
+                batch of queries with shape [num_queries, dim]
+            min_score(float): Minimal similarity score to keep a report
+            k(int): Maximal number of reports to return for each query
+            batch_size(int): Number of queries scored together
+
+        Return:
+            A list of `RelevantAccident` dicts ({"accidentReportID",
+            "similarity"}) sorted by descending similarity for a single query,
+            or a list of such lists for a batch of queries
+        """
+        is_single = np.ndim(query_embeddings) == 1
+        indices, scores = self.top_k(query_embeddings, k, batch_size)
+
+        results = [
+            _to_relevant_accidents(self.report_ids, indices[i], scores[i], min_score)
+            for i in range(indices.shape[0])
+        ]
+
+        return results[0] if is_single else results
@@ -0,0 +1,244 @@
+"""Incremental parser for the XML-tagged outputs of Farsight's prompts.
+
+The prompt templates ask the model to put each item in a tag, such as
+`<stakeholder type="direct" relevance="relevant">...</stakeholder>` or
+`<harm><explain>...</explain><type>...</type><severity>...</severity></harm>`.
+`TagStreamParser` consumes the model output chunk by chunk and returns each
+record as soon as its closing tag arrives, so downstream work can start while
+the model is still generating.
+
+The parser keeps at most one pending record in memory (bounded by
+`max_record_size`) and tolerates malformed output: text outside records and
+stray closing tags are skipped, a record that is interrupted by another opening
+tag or grows too large is dropped, and a record left open at the end of the
+stream is returned as incomplete.
+"""
+
+import re
+from collections import namedtuple
+
+from farsight import metrics
+
+# A parsed record: tag name, dict of tag attributes, inner text, and whether
+# the record has its closing tag
+TagRecord = namedtuple("TagRecord", ["tag", "attrs", "text", "complete"])
+TagRecord.__new__.__defaults__ = (True,)
+
+MAX_RECORD_SIZE = 16384
+
+_ATTR_RE = re.compile(r"""([\w-]+)\s*=\s*["']([^"']*)["']""")
+
+
+def parse_field(text, tag):
+    """
+    Get the inner text of the first <tag></tag> in a record.
+
+    Args:
+        text(str): Record text, e.g., the inner text of a <harm> record
+        tag(str): Field tag name, e.g., "severity"
+
+    Return:
+        The stripped inner text, or None if the field is missing
+    """
+    match = re.search(
+        r"<{0}>(.*?)</\s*{0}\s*>".format(re.escape(tag)), text, re.DOTALL | re.I
+    )
+    return None if match is None else match.group(1).strip()
+
+
+class TagStreamParser:
+    """
+    Parse tagged records from a stream of text chunks.
+    """
+
+    def __init__(self, tags, max_record_size=MAX_RECORD_SIZE):
+        """
+        Args:
+            tags(list[str]): Names of the record tags to parse, e.g., ["harm"]
+            max_record_size(int): Maximal number of characters in one record.
+                Longer records are dropped, which bounds the parser's memory.
+        """
+        self.tags = [t.lower() for t in tags]
+        self.max_record_size = max_record_size
+        tag_pattern = "|".join(re.escape(t) for t in self.tags)
+        self._open_re = re.compile(r"<({})(\s[^<>]*)?>".format(tag_pattern), re.I)
+        self._close_re = re.compile(r"</\s*({})\s*>".format(tag_pattern), re.I)
+
+        # Unparsed text: a pending record from its opening tag, or a trailing
+        # partial tag
+        self._buffer = ""
+        # Position in the buffer to resume searching from, so each character
+        # is only scanned a bounded number of times
+        self._scan_start = 0
+        self._open = None
+
+        # Parsing time of the whole stream, recorded when it is closed
+        self._timer = metrics.timer("tag_parsing")
+
+    def _keep_partial_tag(self):
+        """Only keep a trailing partial tag (e.g., "<stakehol") in the buffer."""
+        start = self._buffer.rfind("<")
+        if (
+            start == -1
+            or ">" in self._buffer[start:]
+            or len(self._buffer) - start > self.max_record_size
+        ):
+            self._buffer = ""
+        else:
+            self._buffer = self._buffer[start:]
+        self._scan_start = 0
+
+    def _drop_open_record(self):
+        """Skip the pending record's opening tag and rescan after it."""
+        self._buffer = self._buffer[self._open.end() :]
+        self._scan_start = 0
+        self._open = None
+
+    def feed(self, chunk):
+        """
+        Consume a chunk of model output.
+
+        Args:
+            chunk(str): New text from the model
+
+        Return:
+            List of TagRecord completed by this chunk
+        """
+        with self._timer:
+            return self._parse(chunk)
+
+    def _parse(self, chunk):
+        """Consume a chunk and return the completed records."""
+        self._buffer += chunk
+        records = []
+
+        while True:
+            if self._open is None:
+                self._open = self._open_re.search(self._buffer, self._scan_start)
+
+                if self._open is None:
+                    self._keep_partial_tag()
+                    break
+
+                # Drop the text before the record
+                self._buffer = self._buffer[self._open.start() :]
+                self._open = self._open_re.match(self._buffer)
+                self._scan_start = self._open.end()
+
+            close = self._close_re.search(self._buffer, self._scan_start)
+            reopen = self._open_re.search(self._buffer, self._scan_start)
+
+            if reopen is not None and (close is None or reopen.start() < close.start()):
+                # The record is interrupted by another opening tag (e.g.,
+                # "<intended><intended>...</intended>"), so parse from there
+                self._drop_open_record()
+                continue
+
+            if close is None:
+                if len(self._buffer) > self.max_record_size:
+                    self._drop_open_record()
+                    continue
+
+                # Wait for the closing tag. Only a trailing partial tag (e.g.,
+                # "</ha") needs to be scanned again with the next chunk.
+                start = self._buffer.rfind("<", self._scan_start)
+                if start == -1 or ">" in self._buffer[start:]:
+                    self._scan_start = len(self._buffer)
+                else:
+                    self._scan_start = start
+                break
+
+            if close.group(1).lower() != self._open.group(1).lower():
+                # A stray closing tag of another record type
+                self._scan_start = close.end()
+                continue
+
+            records.append(
+                TagRecord(
+                    self._open.group(1).lower(),
+                    dict(_ATTR_RE.findall(self._open.group(2) or "")),
+                    self._buffer[self._open.end() : close.start()].strip(),
+                )
+            )
+            self._buffer = self._buffer[close.end() :]
+            self._scan_start = 0
+            self._open = None
+
+        return records
+
+    def close(self):
+        """
+        Finish the stream.
+
+        Return:
+            List with the record that is still open (e.g., when the output is
+            cut off by a stop sequence or the token limit), marked incomplete.
+            Empty if there is no open record.
+        """
+        with self._timer:
+            records = self._close()
+        self._timer.finish()
+        return records
+
+    def _close(self):
+        """Get the open record and reset the parser."""
+        records = []
+        if self._open is not None:
+            text = self._buffer[self._open.end() :]
+
+            # Remove a partial closing tag at the end, e.g., "</ha"
+            start = text.rfind("<")
+            if start != -1 and ">" not in text[start:]:
+                text = text[:start]
+
+            if text.strip() != "":
+                records.append(
+                    TagRecord(
+                        self._open.group(1).lower(),
+                        dict(_ATTR_RE.findall(self._open.group(2) or "")),
+                        text.strip(),
+                        False,
+                    )
+                )
+
+        self._buffer = ""
+        self._scan_start = 0
+        self._open = None
+        return records
+
+
+def parse_stream(chunks, tags, max_record_size=MAX_RECORD_SIZE):
+    """
+    Parse tagged records from an iterable of text chunks, yielding each record
+    as soon as it is complete.
+
+    Args:
+        chunks(iterable[str]): Model output chunks, e.g., from a streaming API
+        tags(list[str]): Names of the record tags to parse
+        max_record_size(int): Maximal number of characters in one record
+
+    Return:
+        Iterator of TagRecord. The last record may be incomplete.
+    """
+    parser = TagStreamParser(tags, max_record_size)
+    try:
+        for chunk in chunks:
+            yield from parser.feed(chunk)
+        yield from parser.close()
+    finally:
+        # Record the parsing time if the caller stops early
+        parser._timer.finish()
+
+
+def parse_tags(text, tags):
+    """
+    Parse all tagged records from a complete model output.
+
+    Args:
+        text(str): Model output
+        tags(list[str]): Names of the record tags to parse
+
+    Return:
+        List of TagRecord in output order. The last record may be incomplete.
+    """
+    return list(parse_stream([text], tags))
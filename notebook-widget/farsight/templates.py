@@ -0,0 +1,59 @@
+"""Prompt templates shared with the Farsight web app (`src/models/prompt-*.json`)."""
+
+import functools
+import json
+import pkgutil
+
+PROMPT_NAMES = ["summary", "use-case", "stakeholder", "harm"]
+
+
+@functools.lru_cache(maxsize=None)
+def _read_prompt(name):
+    """Read and parse a prompt template file once per process."""
+    if name not in PROMPT_NAMES:
+        raise ValueError(
+            "Unknown prompt: {}. Supported prompts are {}.".format(
+                name, ", ".join(PROMPT_NAMES)
+            )
+        )
+
+    data = pkgutil.get_data(__package__, "prompts/prompt-{}.json".format(name))
+    return json.loads(data)
+
+
+def load_prompt(name):
+    """
+    Load a prompt template.
+
+    Args:
+        name(str): Value of "summary" | "use-case" | "stakeholder" | "harm"
+
+    Return:
+        Dict with "task", "prompt", "variables", "temperature", and optional
+        "stopSequences"
+    """
+    return dict(_read_prompt(name))
+
+
+def fill_prompt(prompt, variables):
+    """
+    Replace the {{variable}} placeholders in a prompt template.
+
+    Args:
+        prompt(dict): Prompt template from load_prompt()
+        variables(dict): Value of each variable in prompt["variables"]
+
+    Return:
+        Compiled prompt string
+    """
+    missing = [v for v in prompt["variables"] if v not in variables]
+    if len(missing) > 0:
+        raise ValueError("Missing prompt variables: {}".format(", ".join(missing)))
+
+    compiled_prompt = prompt["prompt"]
+    for variable in prompt["variables"]:
+        compiled_prompt = compiled_prompt.replace(
+            "{{" + variable + "}}", str(variables[variable])
+        )
+
+    return compiled_prompt
@@ -5,13 +5,18 @@
 from json import loads, load, dump
 from setuptools import setup, find_packages
 from pathlib import Path
+from shutil import copyfile
 
 with open("README.md", "r") as readme_file:
     readme = readme_file.read()
 
 requirements = ["ipython"]
 
-test_requirements = []
+# Optional dependencies for offline accident retrieval
+extras_requirements = {"retrieval": ["numpy>=1.17"]}
+
+# The retrieval, ANN, embedding store, projection, and metrics tests use numpy
+test_requirements = ["numpy>=1.17"]
 
 # Read the version from package.json
 package_json_path = "./package.json"
@@ -23,6 +28,12 @@ with open(package_json_path, "r", encoding="utf8") as f:
     with open("./farsight/version.txt", "w", encoding="utf8") as o:
         o.write(version)
 
+# Copy the prompt templates used by the headless Python APIs
+prompt_dir = Path("../src/models")
+if prompt_dir.exists():
+    for prompt_path in prompt_dir.glob("prompt-*.json"):
+        copyfile(prompt_path, Path("./farsight/prompts") / prompt_path.name)
+
 setup(
     author="Jay Wang",
     author_email="jayw@zijie.wang",
@@ -54,6 +65,7 @@ setup(
     ],
     description="A Python package to run Farsight in your computational notebooks.",
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="Apache 2.0 license",
     long_description=readme,
     long_description_content_type="text/markdown",
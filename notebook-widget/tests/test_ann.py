@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""Tests for `farsight.ann` module."""
+
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from farsight import ann, retrieval
+
+
+class TestANN(unittest.TestCase):
+    """Tests for `farsight.ann` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(20, 32))
+        labels = rng.integers(0, 20, size=2000)
+        embeddings = centers[labels] + 0.5 * rng.normal(size=(2000, 32))
+        self.embeddings = ann._normalize(embeddings).astype(np.float32)
+        self.report_ids = np.arange(2000)
+        self.queries = self.embeddings[rng.choice(2000, 30, replace=False)]
+
+        self.exact = retrieval.AccidentIndex(self.embeddings, self.report_ids)
+        self.index = ann.IVFAccidentIndex.build(
+            self.embeddings, self.report_ids, num_lists=40, n_probe=4
+        )
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+
+    def _recall(self, results, k):
+        exact_indices, _ = self.exact.top_k(self.queries, k)
+        hits = 0
+        for exact_row, result in zip(exact_indices, results):
+            exact_ids = set(self.report_ids[exact_row].tolist())
+            hits += len(exact_ids & {r["accidentReportID"] for r in result})
+        return hits / exact_indices.size
+
+    def test_full_probe_is_exact(self):
+        """Scanning every cluster should give the exact results."""
+        results = self.index.query(self.queries, min_score=-1, k=50, n_probe=40)
+        self.assertEqual(self._recall(results, 50), 1.0)
+
+    def test_recall_grows_with_n_probe(self):
+        """Scanning more clusters should not lower recall."""
+        recalls = [
+            self._recall(
+                self.index.query(self.queries, min_score=-1, k=50, n_probe=n), 50
+            )
+            for n in [1, 4, 16]
+        ]
+        self.assertLessEqual(recalls[0], recalls[1])
+        self.assertLessEqual(recalls[1], recalls[2])
+        self.assertGreater(recalls[2], 0.9)
+
+    def test_padding(self):
+        """Rows should be padded when the scanned clusters are too small."""
+        indices, scores = self.index.top_k(self.queries[:2], k=2000, n_probe=1)
+        self.assertEqual(indices.shape, (2, 2000))
+        self.assertTrue(np.any(indices == -1))
+        self.assertTrue(np.all(np.isneginf(scores[indices == -1])))
+
+        results = self.index.query(
+            self.queries[:2], min_score=-np.inf, k=2000, n_probe=1
+        )
+        for row, result in zip(indices, results):
+            self.assertEqual(len(result), int(np.sum(row >= 0)))
+            self.assertTrue(all(np.isfinite(r["similarity"]) for r in result))
+
+    def test_save_load(self):
+        """A saved index should give the same results after loading."""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            self.index.save(tmp_dir)
+            loaded = ann.IVFAccidentIndex.load(tmp_dir)
+
+            self.assertFalse(loaded.embeddings.flags["OWNDATA"])
+            self.assertEqual(loaded.n_probe, 4)
+            self.assertEqual(
+                loaded.query(self.queries, min_score=0.5),
+                self.index.query(self.queries, min_score=0.5),
+            )
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+"""Tests for `farsight.embedding_pipeline` module."""
+
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from farsight import embedding_pipeline
+
+
+def _fake_embedding(text, size=8):
+    """Deterministic embedding of a text."""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [digest[i] / 255 for i in range(size)]
+
+
+class _FakeEndpointHandler(BaseHTTPRequestHandler):
+    """Fake Farsight endpoint, mirroring getEmbeddingFarsight() responses."""
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+        with server.lock:
+            server.requests.append(body["prompt"])
+            fail = server.failures_left > 0
+            if fail:
+                server.failures_left -= 1
+
+        if fail:
+            status, data = 503, {"message": "Service unavailable"}
+        elif body["prompt"] == "bad request":
+            status, data = 400, {"message": "Invalid prompt"}
+        else:
+            status = 200
+            data = {
+                "command": "finishTextGen",
+                "payload": {
+                    "result": _fake_embedding(body["prompt"]),
+                    "fullPrompt": body["prompt"],
+                    "detail": "",
+                },
+            }
+
+        response = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestEmbeddingPipeline(unittest.TestCase):
+    """Tests for `farsight.embedding_pipeline` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeEndpointHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.failures_left = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.backend = embedding_pipeline.FarsightEndpointBackend(
+            "http://127.0.0.1:{}/".format(self.server.server_address[1])
+        )
+        self.tmp_dir = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.tmp_dir, "embeddings.jsonl")
+        self.texts = ["prompt {}".format(i) for i in range(40)]
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run_keeps_order(self):
+        """Results should follow the input order, with duplicates embedded once."""
+        pipeline = embedding_pipeline.EmbeddingPipeline(
+            self.backend, self.checkpoint, max_workers=8
+        )
+        texts = self.texts + self.texts[:5]
+        embeddings = pipeline.run(texts)
+
+        self.assertEqual(embeddings, [_fake_embedding(t) for t in texts])
+        self.assertEqual(sorted(self.server.requests), sorted(self.texts))
+
+    def test_resume_from_checkpoint(self):
+        """A rerun should only embed texts missing from the checkpoint."""
+        embedding_pipeline.EmbeddingPipeline(self.backend, self.checkpoint).run(
+            self.texts[:25]
+        )
+        # Simulate a run that stopped in the middle of writing a line
+        with open(self.checkpoint, "a", encoding="utf8") as fp:
+            fp.write('{"key": "abc", "embed')
+
+        self.server.requests.clear()
+        pipeline = embedding_pipeline.EmbeddingPipeline(self.backend, self.checkpoint)
+        embeddings = pipeline.run(self.texts)
+
+        self.assertEqual(sorted(self.server.requests), sorted(self.texts[25:]))
+        self.assertEqual(embeddings, [_fake_embedding(t) for t in self.texts])
+
+        self.server.requests.clear()
+        pipeline = embedding_pipeline.EmbeddingPipeline(self.backend, self.checkpoint)
+        self.assertEqual(pipeline.run(self.texts), embeddings)
+        self.assertEqual(self.server.requests, [])
+
+    def test_checkpoint_is_keyed_on_model(self):
+        """A checkpoint should not be reused for another model."""
+        embedding_pipeline.EmbeddingPipeline(self.backend, self.checkpoint).run(
+            self.texts[:5]
+        )
+
+        self.server.requests.clear()
+        self.backend.model = "other-embedding"
+        pipeline = embedding_pipeline.EmbeddingPipeline(self.backend, self.checkpoint)
+        pipeline.run(self.texts[:5])
+        self.assertEqual(sorted(self.server.requests), sorted(self.texts[:5]))
+
+    def test_retry_transient_errors(self):
+        """Transient server errors should be retried."""
+        self.server.failures_left = 3
+        pipeline = embedding_pipeline.EmbeddingPipeline(
+            self.backend, max_workers=1, backoff=0.001
+        )
+        embeddings = pipeline.run(self.texts[:2])
+
+        self.assertEqual(embeddings, [_fake_embedding(t) for t in self.texts[:2]])
+        self.assertEqual(len(self.server.requests), 5)
+
+    def test_client_errors_are_not_retried(self):
+        """Client errors should be raised without retrying."""
+        pipeline = embedding_pipeline.EmbeddingPipeline(self.backend, backoff=0.001)
+
+        with self.assertRaises(embedding_pipeline.EmbeddingAPIError) as context:
+            pipeline.run(["bad request"])
+
+        self.assertEqual(context.exception.status, 400)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_client_error_cancels_queued_batches(self):
+        """A final error should stop the queued batches from being sent."""
+
+        class UnauthorizedBackend(embedding_pipeline.EmbeddingBackend):
+            def __init__(self):
+                self.calls = 0
+                self.lock = threading.Lock()
+
+            def embed_batch(self, texts):
+                with self.lock:
+                    self.calls += 1
+                raise embedding_pipeline.EmbeddingAPIError("Invalid key", status=401)
+
+        backend = UnauthorizedBackend()
+        pipeline = embedding_pipeline.EmbeddingPipeline(backend, max_workers=2)
+
+        with self.assertRaises(embedding_pipeline.EmbeddingAPIError):
+            pipeline.run(self.texts)
+
+        # Only the batches that were already running may have been sent
+        self.assertLessEqual(backend.calls, 4)
+
+    def test_token_bucket(self):
+        """The token bucket should not exceed its rate after the first burst."""
+        bucket = embedding_pipeline.TokenBucket(rate=200, capacity=1)
+        start = embedding_pipeline.time.monotonic()
+        for _ in range(21):
+            bucket.acquire()
+        self.assertGreaterEqual(embedding_pipeline.time.monotonic() - start, 0.09)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""Tests for `farsight.embedding_store` module."""
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from farsight import embedding_store, retrieval
+
+
+class TestEmbeddingStore(unittest.TestCase):
+    """Tests for `farsight.embedding_store` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.normal(size=(101, 16)).astype(np.float32)
+        self.report_ids = np.arange(2000, 2101, dtype=np.int32)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.bin_path = os.path.join(self.tmp_dir, "embeddings.bin")
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip_float32(self):
+        """float32 files should be loaded back exactly."""
+        embedding_store.write_embeddings(
+            self.bin_path, self.embeddings, self.report_ids
+        )
+        embeddings, report_ids = embedding_store.load_embeddings(self.bin_path)
+
+        self.assertIsInstance(embeddings, np.memmap)
+        np.testing.assert_array_equal(embeddings, self.embeddings)
+        np.testing.assert_array_equal(report_ids, self.report_ids)
+
+    def test_round_trip_float16(self):
+        """float16 files should halve the matrix size."""
+        embedding_store.write_embeddings(
+            self.bin_path, self.embeddings, self.report_ids, dtype="float16"
+        )
+        embeddings, report_ids = embedding_store.load_embeddings(self.bin_path)
+
+        self.assertEqual(embeddings.dtype, np.float16)
+        np.testing.assert_allclose(embeddings, self.embeddings, atol=1e-2)
+        np.testing.assert_array_equal(report_ids, self.report_ids)
+        self.assertLess(
+            os.path.getsize(self.bin_path), self.embeddings.nbytes // 2 + 1024
+        )
+
+    def test_convert_json(self):
+        """The JSON dataset can be converted and loaded into an index."""
+        json_path = os.path.join(self.tmp_dir, "accident-report-embeddings.json")
+        with open(json_path, "w", encoding="utf8") as fp:
+            json.dump(
+                {
+                    "embeddings": self.embeddings.tolist(),
+                    "reportNumbers": self.report_ids.tolist(),
+                },
+                fp,
+            )
+
+        embedding_store.convert_json(json_path, self.bin_path)
+        index = retrieval.AccidentIndex.from_binary(self.bin_path)
+        np.testing.assert_array_equal(index.embeddings, self.embeddings)
+
+    def test_index_is_zero_copy(self):
+        """Loading float32 files into an index should not copy the matrix."""
+        embedding_store.write_embeddings(
+            self.bin_path, self.embeddings, self.report_ids
+        )
+        embeddings, report_ids = embedding_store.load_embeddings(self.bin_path)
+
+        with mock.patch.object(
+            embedding_store,
+            "load_embeddings",
+            return_value=(embeddings, report_ids),
+        ):
+            index = retrieval.AccidentIndex.from_binary(self.bin_path)
+
+        self.assertTrue(np.shares_memory(index.embeddings, embeddings))
+
+    def test_invalid_file(self):
+        """Files without the magic header should be rejected."""
+        with open(self.bin_path, "wb") as fp:
+            fp.write(b"\x00" * 128)
+
+        with self.assertRaises(ValueError):
+            embedding_store.load_embeddings(self.bin_path)
@@ -3,7 +3,13 @@
 """Tests for `farsight` package."""
 
 
+import base64
+import html
+import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 
 from farsight import farsight
 
@@ -13,9 +19,130 @@ class TestFarsight(unittest.TestCase):
 
     def setUp(self):
         """Set up test fixtures, if any."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.js_path = os.path.join(self.tmp_dir, "farsight.js")
+        with open(self.js_path, "w", encoding="utf8") as fp:
+            fp.write("console.log('<farsight> & \"friends\"');")
+
+        self.path_patch = mock.patch.object(farsight, "_JS_BUNDLE_PATH", self.js_path)
+        self.path_patch.start()
+        farsight._clear_bundle_cache()
 
     def tearDown(self):
         """Tear down test fixtures, if any."""
+        self.path_patch.stop()
+        farsight._clear_bundle_cache()
+        farsight.set_render_mode("inline")
+        shutil.rmtree(self.tmp_dir)
 
     def test_000_something(self):
         """Test something."""
+
+    def test_make_html_matches_full_escape(self):
+        """Cached rendering should match escaping the whole document."""
+        with open(self.js_path, "rb") as fp:
+            js_base64 = base64.b64encode(fp.read()).decode("utf-8")
+
+        result = farsight._make_html("Translate <text> to French", "signal")
+        unescaped = html.unescape(result)
+
+        self.assertTrue(unescaped.startswith(farsight._HTML_TOP))
+        self.assertIn(js_base64, unescaped)
+        self.assertTrue(
+            unescaped.endswith("</farsight-demo-page-signal></body></html>")
+        )
+        self.assertEqual(html.escape(unescaped), result)
+
+    def test_bundle_is_cached(self):
+        """The JS bundle should only be read once across renders."""
+        real_open = open
+        with mock.patch("builtins.open", side_effect=real_open) as mocked_open:
+            farsight._make_html("prompt 1", "farsight")
+            farsight._make_html("prompt 2", "lite")
+            bundle_reads = [
+                c for c in mocked_open.call_args_list if c.args[0] == self.js_path
+            ]
+        self.assertEqual(len(bundle_reads), 1)
+
+    def test_bundle_cache_invalidation(self):
+        """Updating farsight.js should invalidate the cached bundle."""
+        first = farsight._make_html("prompt", "farsight")
+
+        with open(self.js_path, "w", encoding="utf8") as fp:
+            fp.write("console.log('updated');")
+        stat = os.stat(self.js_path)
+        os.utime(self.js_path, (stat.st_atime, stat.st_mtime + 10))
+
+        second = farsight._make_html("prompt", "farsight")
+        self.assertNotEqual(first, second)
+        self.assertIn(
+            base64.b64encode(b"console.log('updated');").decode("utf-8"),
+            html.unescape(second),
+        )
+
+    def test_session_mode_registers_bundle_once(self):
+        """Session mode should only emit the JS bundle with the first widget."""
+        farsight.set_render_mode("session")
+        js_base64 = farsight._get_bundle()["base64"]
+
+        with mock.patch.object(farsight, "display_html") as mocked_display:
+            farsight.envision("prompt 1")
+            farsight.symbol("prompt 2")
+            farsight.sidebar("prompt 3")
+
+        outputs = [c.args[0] for c in mocked_display.call_args_list]
+        self.assertEqual(len(outputs), 4)
+        self.assertIn(js_base64, outputs[0])
+        for output in outputs[1:]:
+            self.assertIn("<iframe", output)
+            self.assertNotIn(js_base64, html.unescape(output))
+
+    def test_session_loader_checks_key(self):
+        """Session widgets should only load a bundle with their own key."""
+        farsight.set_render_mode("session")
+        key = farsight._get_bundle()["key"]
+        loader = html.unescape(farsight._make_html("prompt", "farsight"))
+
+        self.assertIn("bundle.key !== '{}'".format(key), loader)
+        self.assertIn("retries = {}".format(farsight._SESSION_LOADER_RETRIES), loader)
+        self.assertIn("set_render_mode('session')", loader)
+
+    def test_unknown_render_mode(self):
+        """Unknown render modes should be rejected."""
+        with self.assertRaises(ValueError):
+            farsight.set_render_mode("shared")
+
+    def test_envision_many_single_output(self):
+        """Batch rendering should emit one output with one bundle copy."""
+        js_base64 = farsight._get_bundle()["base64"]
+        prompts = ["prompt {}".format(i) for i in range(50)] + [
+            "</script>",
+            "<!--<script>",
+        ]
+
+        with mock.patch.object(farsight, "display_html") as mocked_display:
+            farsight.envision_many(prompts, component="signal", page_size=10)
+
+        self.assertEqual(mocked_display.call_count, 1)
+        output = mocked_display.call_args.args[0]
+        self.assertEqual(output.count(js_base64), 1)
+        self.assertIn('"prompt 49"', output)
+        self.assertIn('"\\u003c/script>"', output)
+        self.assertIn('"\\u003c!--\\u003cscript>"', output)
+        self.assertNotIn("<!--", output)
+        self.assertNotIn("<iframe", output)
+
+    def test_envision_many_session_registration(self):
+        """Batch rendering should register the bundle for later widgets."""
+        farsight.set_render_mode("session")
+        js_base64 = farsight._get_bundle()["base64"]
+
+        with mock.patch.object(farsight, "display_html") as mocked_display:
+            farsight.envision_many(["prompt 1", "prompt 2"])
+            farsight.envision("prompt 3")
+            farsight.envision_many(["prompt 4"])
+
+        outputs = [c.args[0] for c in mocked_display.call_args_list]
+        self.assertEqual(len(outputs), 3)
+        self.assertEqual(sum(js_base64 in html.unescape(o) for o in outputs), 1)
+        self.assertIn(js_base64, outputs[0])
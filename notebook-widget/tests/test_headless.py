@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+
+"""Tests for `farsight.headless` module."""
+
+import threading
+import unittest
+
+import farsight
+from farsight.headless import FakeTextGenBackend, TextGenBackend, envision_headless
+from farsight.llm_cache import LLMCache
+
+
+class _BlockingBackend(FakeTextGenBackend):
+    """Fake backend that tracks the number of concurrent generations."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.active = 0
+        self.max_active = 0
+
+    def generate(self, prompt, temperature, stop_sequences=None):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            yield from super().generate(prompt, temperature, stop_sequences)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class _CountingBackend(FakeTextGenBackend):
+    """Fake backend that counts the streamed chunks that are read."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.num_chunks = 0
+
+    def generate(self, prompt, temperature, stop_sequences=None):
+        for chunk in super().generate(prompt, temperature, stop_sequences):
+            with self.lock:
+                self.num_chunks += 1
+            yield chunk
+
+
+class TestHeadless(unittest.TestCase):
+    """Tests for `envision_headless()`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.prompt = "Summarize the witness statement for a lawyer."
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+
+    def test_full_tree(self):
+        """Without limits, every use case and stakeholder should be expanded."""
+        backend = FakeTextGenBackend()
+        tree = envision_headless(self.prompt, backend)
+
+        self.assertEqual(tree["prompt"], self.prompt)
+        self.assertTrue(tree["summary"].startswith("Fake functionality"))
+        self.assertEqual(len(tree["use_cases"]), 12)
+        self.assertEqual(
+            {u["category"] for u in tree["use_cases"]},
+            {"intended", "highstakes", "misuse"},
+        )
+
+        for use_case in tree["use_cases"]:
+            self.assertEqual(len(use_case["stakeholders"]), 8)
+            for stakeholder in use_case["stakeholders"]:
+                self.assertIn(stakeholder["category"], ["direct", "indirect"])
+                self.assertIn(stakeholder["relevance"], [1, 2])
+                self.assertEqual(
+                    [h["severity"] for h in stakeholder["harms"]], [3, 2, 1]
+                )
+                self.assertIn(stakeholder["text"], stakeholder["harms"][0]["text"])
+
+        # 1 summary + 12 use case expansions + 12 * 8 stakeholder expansions
+        self.assertEqual(backend.num_calls, 1 + 1 + 12 + 12 * 8)
+
+    def test_depth_and_breadth_limits(self):
+        """The tree should stop at the requested depth and breadth."""
+        backend = FakeTextGenBackend()
+        tree = envision_headless(
+            self.prompt,
+            backend,
+            summary="Summarize witness statements",
+            depth=2,
+            max_use_cases=2,
+            max_stakeholders=3,
+        )
+
+        self.assertEqual(tree["summary"], "Summarize witness statements")
+        self.assertEqual(len(tree["use_cases"]), 2)
+        for use_case in tree["use_cases"]:
+            self.assertEqual(len(use_case["stakeholders"]), 3)
+            for stakeholder in use_case["stakeholders"]:
+                self.assertEqual(stakeholder["harms"], [])
+        self.assertEqual(backend.num_calls, 1 + 2)
+
+        tree = envision_headless(self.prompt, backend, depth=1)
+        self.assertTrue(all(u["stakeholders"] == [] for u in tree["use_cases"]))
+
+        with self.assertRaises(ValueError):
+            envision_headless(self.prompt, backend, depth=4)
+
+    def test_stop_reading_after_limits(self):
+        """Streams should only be read after the limits when they are cached."""
+        chunks = []
+        for cache in [None, LLMCache()]:
+            backend = _CountingBackend(chunk_size=8)
+            envision_headless(
+                self.prompt,
+                backend,
+                summary="Summarize witness statements",
+                max_use_cases=1,
+                max_stakeholders=1,
+                max_harms=1,
+                cache=cache,
+            )
+            chunks.append(backend.num_chunks)
+        self.assertLess(chunks[0], chunks[1] / 2)
+
+    def test_concurrency_cap(self):
+        """At most max_concurrency generations should run at once."""
+        backend = _BlockingBackend(chunk_size=32, delay=0.002)
+        tree = envision_headless(
+            self.prompt, backend, max_use_cases=3, max_stakeholders=4, max_concurrency=4
+        )
+
+        self.assertLessEqual(backend.max_active, 4)
+        self.assertGreater(backend.max_active, 1)
+        self.assertEqual(
+            sum(len(s["harms"]) for u in tree["use_cases"] for s in u["stakeholders"]),
+            3 * 4 * 3,
+        )
+
+    def test_deterministic(self):
+        """The tree should not depend on how the output is chunked."""
+        tree_1 = envision_headless(self.prompt, FakeTextGenBackend(chunk_size=5))
+        tree_2 = envision_headless(self.prompt, FakeTextGenBackend(chunk_size=64))
+        self.assertEqual(tree_1, tree_2)
+
+    def test_cache(self):
+        """A second run with the same cache should not call the backend."""
+        cache = LLMCache()
+        backend = FakeTextGenBackend()
+        tree_1 = envision_headless(self.prompt, backend, max_use_cases=2, cache=cache)
+        num_calls = backend.num_calls
+
+        tree_2 = envision_headless(self.prompt, backend, max_use_cases=2, cache=cache)
+        self.assertEqual(tree_1, tree_2)
+        self.assertEqual(backend.num_calls, num_calls)
+        self.assertEqual(cache.stats()["misses"], num_calls)
+
+    def test_backend_error(self):
+        """A backend error in a worker should be raised to the caller."""
+
+        class FailingBackend(TextGenBackend):
+            model = "failing"
+
+            def generate(self, prompt, temperature, stop_sequences=None):
+                if prompt.endswith("harms: "):
+                    raise RuntimeError("harm generation failed")
+                yield from FakeTextGenBackend().generate(
+                    prompt, temperature, stop_sequences
+                )
+
+        with self.assertRaises(RuntimeError):
+            envision_headless(self.prompt, FailingBackend(), max_use_cases=1)
+
+    def test_on_harm(self):
+        """on_harm should be called once for each harm in the tree."""
+        seen = []
+        lock = threading.Lock()
+
+        def on_harm(harm, stakeholder, use_case):
+            self.assertIn(harm, stakeholder["harms"])
+            self.assertIn(stakeholder, use_case["stakeholders"])
+            with lock:
+                seen.append(harm["text"])
+
+        tree = envision_headless(
+            self.prompt,
+            FakeTextGenBackend(),
+            max_use_cases=2,
+            max_stakeholders=2,
+            max_harms=2,
+            on_harm=on_harm,
+        )
+
+        harms = [
+            h["text"]
+            for u in tree["use_cases"]
+            for s in u["stakeholders"]
+            for h in s["harms"]
+        ]
+        self.assertEqual(len(harms), 2 * 2 * 2)
+        self.assertEqual(sorted(seen), sorted(harms))
+
+    def test_truncated_harm(self):
+        """A harm cut off after its explanation should be kept."""
+
+        class TruncatedBackend(FakeTextGenBackend):
+            def _respond(self, prompt):
+                text = super()._respond(prompt)
+                if prompt.endswith("harms: "):
+                    # Cut off the last harm after its explanation
+                    return text[: text.rfind("<type>")]
+                return text
+
+        tree = envision_headless(
+            self.prompt, TruncatedBackend(), max_use_cases=1, max_stakeholders=1
+        )
+        harms = tree["use_cases"][0]["stakeholders"][0]["harms"]
+        self.assertEqual([h["severity"] for h in harms], [3, 2, 2])
+        self.assertIsNone(harms[-1]["type"])
+
+    def test_export(self):
+        """envision_headless should be exported by the package."""
+        self.assertIs(farsight.envision_headless, envision_headless)
+
+
+if __name__ == "__main__":
+    unittest.main()
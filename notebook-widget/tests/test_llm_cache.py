@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+"""Tests for `farsight.llm_cache` module."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from farsight import llm_cache, templates
+
+
+class TestLLMCache(unittest.TestCase):
+    """Tests for `farsight.llm_cache` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "cache.sqlite")
+        self.prompt = templates.load_prompt("harm")
+        self.variables = {
+            "functionality": "Translate text",
+            "usecase": "Tourists use it to read menus",
+            "stakeholder": "Restaurant owners",
+        }
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        shutil.rmtree(self.tmp_dir)
+
+    def test_cache_key(self):
+        """Keys should change with the template, variables, model, and temperature."""
+        key = llm_cache.make_cache_key(self.prompt, self.variables, "gemini-pro", 0.1)
+
+        self.assertEqual(
+            key,
+            llm_cache.make_cache_key(
+                self.prompt, dict(reversed(self.variables.items())), "gemini-pro", 0.1
+            ),
+        )
+        other_keys = [
+            llm_cache.make_cache_key(
+                templates.load_prompt("stakeholder"), self.variables, "gemini-pro", 0.1
+            ),
+            llm_cache.make_cache_key(
+                self.prompt,
+                dict(self.variables, stakeholder="Chefs"),
+                "gemini-pro",
+                0.1,
+            ),
+            llm_cache.make_cache_key(self.prompt, self.variables, "gpt-3.5", 0.1),
+            llm_cache.make_cache_key(self.prompt, self.variables, "gemini-pro", 0.0),
+            llm_cache.make_cache_key(
+                self.prompt, self.variables, "gemini-pro", 0.1, kind="embedding"
+            ),
+        ]
+        self.assertEqual(len(set(other_keys + [key])), 6)
+
+    def test_get_or_compute_persists(self):
+        """Repeated requests should hit the cache, also after reopening it."""
+        compute = mock.Mock(return_value="<harm>...</harm>")
+        cache = llm_cache.LLMCache(self.path)
+
+        self.assertEqual(cache.get_or_compute("key", compute), "<harm>...</harm>")
+        self.assertEqual(cache.get_or_compute("key", compute), "<harm>...</harm>")
+        cache.close()
+
+        cache = llm_cache.LLMCache(self.path)
+        self.assertEqual(cache.get_or_compute("key", compute), "<harm>...</harm>")
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+        cache.close()
+
+    def test_max_entries_evicts_least_recently_used(self):
+        """The least recently used entries should be evicted first."""
+        cache = llm_cache.LLMCache(max_entries=2)
+        with mock.patch.object(llm_cache.time, "time", side_effect=range(100)):
+            cache.set("a", 1)
+            cache.set("b", 2)
+            cache.get("a")
+            cache.set("c", 3)
+
+            self.assertEqual(cache.get("a"), 1)
+            self.assertIsNone(cache.get("b"))
+            self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_eviction_ties_keep_newest(self):
+        """Entries with the same access time should be evicted oldest first."""
+        for limits in [{"max_entries": 2}, {"max_bytes": 2}]:
+            cache = llm_cache.LLMCache(**limits)
+            with mock.patch.object(llm_cache.time, "time", return_value=100):
+                for key in ["a", "b", "c"]:
+                    cache.set(key, 1)
+
+                self.assertIsNone(cache.get("a"))
+                self.assertEqual(cache.get("c"), 1)
+                if "max_entries" in limits:
+                    self.assertEqual(cache.get("b"), 1)
+            cache.close()
+
+    def test_max_bytes(self):
+        """The total size of the values should stay under max_bytes."""
+        cache = llm_cache.LLMCache(max_bytes=100)
+        for i in range(10):
+            cache.set(str(i), "x" * 30)
+
+        stats = cache.stats()
+        self.assertLessEqual(stats["bytes"], 100)
+        self.assertEqual(stats["entries"], 3)
+        self.assertEqual(cache.get("9"), "x" * 30)
+
+    def test_limits_after_reopening(self):
+        """The limits should count the entries already in the database."""
+        cache = llm_cache.LLMCache(self.path)
+        for key in ["a", "b", "c"]:
+            cache.set(key, "x" * 10)
+        cache.set("a", "x" * 20)
+        cache.close()
+
+        cache = llm_cache.LLMCache(self.path, max_entries=3, max_bytes=45)
+        cache.set("d", "x" * 10)
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["bytes"], 34)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "x" * 20)
+        cache.close()
+
+    def test_ttl(self):
+        """Expired entries should count as misses."""
+        cache = llm_cache.LLMCache(ttl=10)
+        with mock.patch.object(llm_cache.time, "time", return_value=100):
+            cache.set("embedding", [0.1, 0.2])
+        with mock.patch.object(llm_cache.time, "time", return_value=105):
+            self.assertEqual(cache.get("embedding"), [0.1, 0.2])
+        with mock.patch.object(llm_cache.time, "time", return_value=111):
+            self.assertIsNone(cache.get("embedding"))
+
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+        self.assertEqual(len(cache), 0)
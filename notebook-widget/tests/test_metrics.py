@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+"""Tests for `farsight.metrics` module."""
+
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from farsight import farsight, metrics
+from farsight.headless import FakeTextGenBackend, envision_headless
+from farsight.llm_cache import LLMCache
+from farsight.retrieval import AccidentIndex
+from farsight.tag_parser import parse_stream
+
+
+class TestMetrics(unittest.TestCase):
+    """Tests for `farsight.metrics` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.temp_dir = tempfile.mkdtemp()
+        metrics.disable_metrics()
+        metrics.reset_metrics()
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        metrics.disable_metrics()
+        metrics.reset_metrics()
+        farsight._clear_bundle_cache()
+        shutil.rmtree(self.temp_dir)
+
+    def test_disabled(self):
+        """Disabled metrics should record nothing."""
+        self.assertIs(metrics.span("a"), metrics.span("b"))
+        with metrics.span("similarity_scoring"):
+            metrics.increment("api_calls")
+        self.assertEqual(metrics.get_metrics(), {"counters": {}, "histograms": {}})
+
+    def test_spans_and_counters(self):
+        """Spans and counters should be recorded, including errors."""
+        spans = []
+        metrics.enable_metrics(lambda *args: spans.append(args))
+
+        with metrics.span("stage", {"size": 3}):
+            pass
+        with self.assertRaises(RuntimeError):
+            with metrics.span("stage"):
+                raise RuntimeError("failed")
+        metrics.increment("api_calls", 2)
+
+        result = metrics.get_metrics()
+        self.assertEqual(result["counters"], {"api_calls": 2, "stage_errors": 1})
+        histogram = result["histograms"]["stage"]
+        self.assertEqual(histogram["count"], 2)
+        self.assertEqual(sum(histogram["buckets"].values()), 2)
+
+        self.assertEqual([s[0] for s in spans], ["stage", "stage"])
+        self.assertEqual(spans[0][3], {"size": 3})
+        self.assertLessEqual(spans[0][1], spans[0][2])
+        self.assertIsNone(spans[0][4])
+        self.assertIsInstance(spans[1][4], RuntimeError)
+
+    def test_streaming_stages(self):
+        """Streaming stages should be recorded once, without the consumer's time."""
+        spans = []
+        metrics.enable_metrics(lambda *args: spans.append(args))
+
+        # One span for the whole stream, not one per chunk
+        records = list(parse_stream(["<harm>a</harm>", "<harm>b", "</harm>"], ["harm"]))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(metrics.get_metrics()["histograms"]["tag_parsing"]["count"], 1)
+
+        # The consumer's time between items is not counted
+        for _ in metrics.timed_iter("llm_generation", [1, 2], {"task": "harm"}):
+            time.sleep(0.05)
+        histogram = metrics.get_metrics()["histograms"]["llm_generation"]
+        self.assertEqual(histogram["count"], 1)
+        self.assertLess(histogram["sum"], 0.05)
+        self.assertEqual(spans[-1][3], {"task": "harm"})
+
+        def failing_stream():
+            yield "<harm>"
+            raise RuntimeError("failed")
+
+        with self.assertRaises(RuntimeError):
+            list(metrics.timed_iter("llm_generation", failing_stream()))
+        self.assertEqual(metrics.get_metrics()["counters"]["llm_generation_errors"], 1)
+        self.assertIsInstance(spans[-1][4], RuntimeError)
+
+    def test_prometheus(self):
+        """Metrics should be written in the Prometheus text format."""
+        metrics.enable_metrics()
+        with metrics.span("llm_generation"):
+            pass
+        metrics.increment("llm_cache_hits")
+
+        path = os.path.join(self.temp_dir, "farsight.prom")
+        metrics.write_prometheus(path)
+        with open(path, "r", encoding="utf8") as fp:
+            text = fp.read()
+
+        self.assertIn("# TYPE farsight_llm_cache_hits_total counter", text)
+        self.assertIn("farsight_llm_cache_hits_total 1\n", text)
+        self.assertIn(
+            'farsight_stage_duration_seconds_bucket{stage="llm_generation",le="+Inf"} 1',
+            text,
+        )
+        self.assertIn(
+            'farsight_stage_duration_seconds_count{stage="llm_generation"} 1', text
+        )
+
+    def test_opentelemetry_callback(self):
+        """Spans should be passed to the OpenTelemetry tracer."""
+        tracer = mock.Mock()
+        metrics.enable_metrics(metrics.opentelemetry_callback(tracer))
+        with metrics.span("tag_parsing", {"chunk": 1}):
+            pass
+
+        tracer.start_span.assert_called_once()
+        self.assertEqual(tracer.start_span.call_args[0][0], "farsight.tag_parsing")
+        self.assertEqual(tracer.start_span.call_args[1]["attributes"], {"chunk": 1})
+        tracer.start_span.return_value.end.assert_called_once()
+
+    def test_instrumented_stages(self):
+        """Rendering, retrieval, and generation should record their stages."""
+        metrics.enable_metrics()
+
+        bundle_path = os.path.join(self.temp_dir, "farsight.js")
+        with open(bundle_path, "w", encoding="utf8") as fp:
+            fp.write("console.log('<farsight>');")
+        with mock.patch.object(farsight, "_JS_BUNDLE_PATH", bundle_path):
+            farsight._make_html("prompt", "farsight")
+            farsight._make_html("prompt", "lite")
+
+        index = AccidentIndex(np.eye(4, dtype=np.float32), np.arange(4))
+        index.top_k(np.eye(4, dtype=np.float32), 2)
+
+        cache = LLMCache()
+        for _ in range(2):
+            envision_headless("prompt", FakeTextGenBackend(), depth=1, cache=cache)
+
+        result = metrics.get_metrics()
+        self.assertEqual(result["counters"]["bundle_cache_misses"], 1)
+        self.assertEqual(result["counters"]["bundle_cache_hits"], 1)
+        self.assertEqual(result["counters"]["llm_api_calls"], 2)
+        self.assertEqual(result["counters"]["llm_cache_hits"], 2)
+        self.assertEqual(result["counters"]["llm_cache_misses"], 2)
+        self.assertEqual(result["histograms"]["html_escaping"]["count"], 3)
+        for stage in [
+            "bundle_encoding",
+            "similarity_scoring",
+            "llm_generation",
+            "tag_parsing",
+        ]:
+            self.assertGreater(result["histograms"][stage]["count"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
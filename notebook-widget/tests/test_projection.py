@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+"""Tests for `farsight.projection` module."""
+
+
+import json
+import os
+import shutil
+import tempfile
+import types
+import unittest
+
+import numpy as np
+
+from farsight import projection
+
+
+# Points of a small map, with the grid of the first 10 points and the grid of
+# all 12 points from `wizmap.generate_grid_dict(xs, ys, texts, "Test",
+# grid_size=6, labels=labels, group_names=["Incident", "Prompt"])` (wizmap
+# 0.1.7). The topics are trimmed to one zoom level.
+WIZMAP_XS = [
+    0.19,
+    -0.52,
+    -0.41,
+    -2.44,
+    1.8,
+    1.14,
+    -0.33,
+    0.77,
+    0.28,
+    -0.55,
+    0.98,
+    -0.31,
+]
+WIZMAP_YS = [-0.33, -0.79, 0.45, -0.1, 0.55, -0.61, 0.13, -0.89, 0.84, 0.19, 0.33, 0.41]
+WIZMAP_LABELS = [0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0]
+
+WIZMAP_GRID_10 = {
+    "grid": [
+        [0.0003, 0.0011, 0.0043, 0.007, 0.0073, 0.0025],
+        [0.0068, 0.0114, 0.0364, 0.0558, 0.0533, 0.019],
+        [0.0304, 0.0362, 0.0994, 0.1302, 0.094, 0.0392],
+        [0.0266, 0.0364, 0.1112, 0.13, 0.0699, 0.0438],
+        [0.0045, 0.0096, 0.0388, 0.0537, 0.0306, 0.021],
+        [0.0001, 0.0006, 0.0035, 0.0066, 0.0041, 0.0023],
+    ],
+    "xRange": [-2.5248, 1.8848],
+    "yRange": [-2.2298, 2.1798],
+    "padded": True,
+    "sampleSize": 10,
+    "totalPointSize": 10,
+    "groupGrids": {
+        "Incident": [
+            [0.0005, 0.0017, 0.006, 0.0099, 0.0102, 0.0037],
+            [0.0089, 0.0144, 0.0425, 0.0676, 0.0649, 0.0246],
+            [0.0356, 0.0388, 0.0943, 0.1349, 0.108, 0.0487],
+            [0.0312, 0.0348, 0.0865, 0.1008, 0.0655, 0.0507],
+            [0.0059, 0.0093, 0.0276, 0.028, 0.0192, 0.0236],
+            [0.0002, 0.0007, 0.0023, 0.0022, 0.0019, 0.0028],
+        ],
+        "Prompt": [
+            [0.0002, 0.0012, 0.0026, 0.0021, 0.0007, 0.0001],
+            [0.002, 0.0111, 0.0245, 0.0219, 0.0085, 0.0015],
+            [0.0068, 0.0394, 0.0916, 0.0913, 0.0414, 0.0086],
+            [0.009, 0.0545, 0.1396, 0.1612, 0.0857, 0.02],
+            [0.0046, 0.0304, 0.0894, 0.1213, 0.0733, 0.0185],
+            [0.0009, 0.0071, 0.0244, 0.0381, 0.0251, 0.0066],
+        ],
+    },
+    "groupTotalPointSizes": {"Incident": 8, "Prompt": 2},
+    "groupNames": ["Incident", "Prompt"],
+    "topic": {
+        "extent": [[-3, -1], [5, 7]],
+        "data": {
+            "6": [
+                [-2.438, -0.062, "text---"],
+                [-0.562, -0.812, "text---"],
+                [0.812, -0.938, "text---"],
+                [0.188, -0.312, "text---"],
+                [-0.562, 0.188, "text---"],
+                [-0.312, 0.188, "text---"],
+                [-0.438, 0.438, "text---"],
+                [0.312, 0.812, "text---"],
+                [1.188, -0.562, "text---"],
+                [1.812, 0.562, "text---"],
+            ]
+        },
+        "range": [-2.44, -0.89, 1.8, 0.84],
+    },
+    "embeddingName": "Test",
+}
+
+WIZMAP_GRID_12 = {
+    "grid": [
+        [0.0002, 0.0008, 0.0032, 0.0052, 0.0056, 0.0018],
+        [0.0053, 0.0088, 0.0307, 0.0473, 0.0464, 0.0157],
+        [0.0265, 0.0309, 0.0947, 0.1273, 0.0964, 0.0382],
+        [0.023, 0.0333, 0.1205, 0.1487, 0.0917, 0.0494],
+        [0.0035, 0.0087, 0.0417, 0.0592, 0.0369, 0.0216],
+        [0.0001, 0.0005, 0.0032, 0.0059, 0.0037, 0.0019],
+    ],
+    "groupGrids": {
+        "Incident": [
+            [0.0004, 0.0014, 0.005, 0.0082, 0.0086, 0.003],
+            [0.0077, 0.0125, 0.0388, 0.0613, 0.0586, 0.0214],
+            [0.0327, 0.0366, 0.0982, 0.1357, 0.1004, 0.0433],
+            [0.0286, 0.0362, 0.108, 0.121, 0.0638, 0.0461],
+            [0.0051, 0.0103, 0.0374, 0.0377, 0.0192, 0.0213],
+            [0.0002, 0.0007, 0.003, 0.0029, 0.0018, 0.0023],
+        ],
+        "Prompt": [
+            [0.0001, 0.0005, 0.0012, 0.0013, 0.0009, 0.0004],
+            [0.0008, 0.0061, 0.0157, 0.0183, 0.0141, 0.0061],
+            [0.0035, 0.0256, 0.07, 0.091, 0.0736, 0.0311],
+            [0.0047, 0.0364, 0.1107, 0.164, 0.1351, 0.0537],
+            [0.0021, 0.0182, 0.0651, 0.1103, 0.0896, 0.0323],
+            [0.0003, 0.0034, 0.0146, 0.0276, 0.0216, 0.0069],
+        ],
+    },
+}
+
+
+class TestProjection(unittest.TestCase):
+    """Tests for `farsight.projection` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.temp_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.normal(size=(500, 16)).astype(np.float32)
+        self.coordinates = rng.uniform(-10, 10, size=(500, 2)).astype(np.float32)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_transform(self):
+        """New embeddings should land among their nearest reference points."""
+        projector = projection.KNNProjector(self.embeddings, self.coordinates, k=5)
+
+        # A reference point lands on its own coordinates
+        placed = projector.transform(self.embeddings[:10])
+        np.testing.assert_allclose(placed, self.coordinates[:10], atol=1e-3)
+
+        # Other points land in the hull of their neighbors
+        rng = np.random.default_rng(1)
+        placed = projector.transform(rng.normal(size=(20, 16)), batch_size=7)
+        self.assertEqual(placed.shape, (20, 2))
+        self.assertTrue(np.all(np.abs(placed) <= 10))
+
+        with self.assertRaises(ValueError):
+            projection.KNNProjector(self.embeddings, self.coordinates[:10])
+
+    def test_from_umap_save_load(self):
+        """A projector from a UMAP model should work after saving and loading."""
+        model = types.SimpleNamespace(
+            _raw_data=self.embeddings, embedding_=self.coordinates, n_neighbors=15
+        )
+        projector = projection.KNNProjector.from_umap(model)
+        self.assertEqual(projector.k, 15)
+        self.assertEqual(len(projector), 500)
+
+        path = os.path.join(self.temp_dir, "projector")
+        projector.save(path)
+        loaded = projection.KNNProjector.load(path)
+
+        self.assertEqual(loaded.k, 15)
+        queries = self.embeddings[:3] + 0.1
+        np.testing.assert_allclose(
+            loaded.transform(queries), projector.transform(queries), atol=1e-4
+        )
+
+    def test_kde_grid_matches_wizmap(self):
+        """The density grid should match WizMap's grid of the same points."""
+        xs = np.array(WIZMAP_XS[:10])
+        ys = np.array(WIZMAP_YS[:10])
+        grid = projection._kde_grid(
+            xs,
+            ys,
+            WIZMAP_GRID_10["xRange"],
+            WIZMAP_GRID_10["yRange"],
+            6,
+            projection._bandwidth(10),
+        )
+        np.testing.assert_allclose(grid / 10, WIZMAP_GRID_10["grid"], atol=1e-4)
+
+    def test_append_to_wizmap(self):
+        """Appended points should be added to the data and density grids."""
+        xs = WIZMAP_XS
+        ys = WIZMAP_YS
+        labels = WIZMAP_LABELS
+        texts = ["text {}".format(i) for i in range(12)]
+
+        # Write the map of the first 10 points, then append the last 2
+        with open(os.path.join(self.temp_dir, "grid.json"), "w") as fp:
+            json.dump(WIZMAP_GRID_10, fp)
+        with open(os.path.join(self.temp_dir, "data.ndjson"), "w") as fp:
+            fp.write(
+                "\n".join(
+                    json.dumps([xs[i], ys[i], texts[i], "", labels[i]])
+                    for i in range(10)
+                )
+            )
+
+        projection.append_to_wizmap(
+            self.temp_dir, xs[10:], ys[10:], texts[10:], labels=labels[10:]
+        )
+
+        with open(os.path.join(self.temp_dir, "data.ndjson"), "r") as fp:
+            rows = [json.loads(line) for line in fp]
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[-1], [xs[-1], ys[-1], texts[-1], "", 0])
+
+        with open(os.path.join(self.temp_dir, "grid.json"), "r") as fp:
+            updated = json.load(fp)
+
+        self.assertEqual(updated["totalPointSize"], 12)
+        self.assertEqual(updated["sampleSize"], 12)
+        self.assertEqual(updated["groupTotalPointSizes"], {"Incident": 9, "Prompt": 3})
+        self.assertEqual(updated["topic"], WIZMAP_GRID_10["topic"])
+        self.assertEqual(updated["xRange"], WIZMAP_GRID_10["xRange"])
+
+        # The update keeps the bandwidth of the smaller map, so it is close to
+        # but not the same as rerunning WizMap on all points
+        np.testing.assert_allclose(updated["grid"], WIZMAP_GRID_12["grid"], atol=0.005)
+        for name, atol in [("Incident", 0.005), ("Prompt", 0.02)]:
+            np.testing.assert_allclose(
+                updated["groupGrids"][name],
+                WIZMAP_GRID_12["groupGrids"][name],
+                atol=atol,
+            )
+
+        with self.assertRaises(ValueError):
+            projection.append_to_wizmap(self.temp_dir, [0.0], [0.0], ["a"])
+        with self.assertRaises(ValueError):
+            projection.append_to_wizmap(self.temp_dir, [0.0], [0.0], ["a"], labels=[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""Tests for `farsight.retrieval` module."""
+
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from farsight import retrieval
+
+
+def _naive_query(embeddings, report_ids, query, min_score, k):
+    """Port of startQueryAccidents() in text-emb-worker.ts."""
+    scores = embeddings @ query
+    results = [
+        {"accidentReportID": int(report_ids[i]), "similarity": round(float(s), 6)}
+        for i, s in enumerate(scores)
+        if s >= min_score
+    ]
+    results.sort(key=lambda r: -r["similarity"])
+    return results[:k]
+
+
+class TestRetrieval(unittest.TestCase):
+    """Tests for `farsight.retrieval` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        rng = np.random.default_rng(0)
+        embeddings = rng.normal(size=(500, 32)).astype(np.float32)
+        self.embeddings = embeddings / np.linalg.norm(embeddings, axis=1)[:, None]
+        self.report_ids = np.arange(1000, 1500)
+        self.queries = self.embeddings[:20] + 0.3 * rng.normal(size=(20, 32))
+        self.queries = self.queries.astype(np.float32)
+        self.index = retrieval.AccidentIndex(self.embeddings, self.report_ids)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+
+    def test_query_matches_worker(self):
+        """Batch top-k results should match the JS worker's full sort."""
+        results = self.index.query(self.queries, min_score=0.1, k=30)
+
+        self.assertEqual(len(results), len(self.queries))
+        for query, result in zip(self.queries, results):
+            expected = _naive_query(self.embeddings, self.report_ids, query, 0.1, 30)
+            self.assertEqual(
+                [r["accidentReportID"] for r in result],
+                [r["accidentReportID"] for r in expected],
+            )
+            for r, e in zip(result, expected):
+                self.assertAlmostEqual(r["similarity"], e["similarity"], places=5)
+
+    def test_single_query(self):
+        """A 1D query should return a single list of relevant accidents."""
+        result = self.index.query(self.embeddings[3], min_score=0.6)
+        self.assertEqual(result[0]["accidentReportID"], 1003)
+        self.assertTrue(all(r["similarity"] >= 0.6 for r in result))
+
+    def test_small_batches(self):
+        """Scoring in small batches should not change the results."""
+        indices, scores = self.index.top_k(self.queries, k=600, batch_size=3)
+        full_indices, full_scores = self.index.top_k(self.queries, k=600)
+
+        self.assertEqual(indices.shape, (20, 500))
+        np.testing.assert_array_equal(
+            np.sort(indices, axis=1), np.sort(full_indices, axis=1)
+        )
+        np.testing.assert_allclose(scores, full_scores, atol=1e-5)
+
+    def test_from_json(self):
+        """The index can be loaded from gzipped embedding JSON."""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "accident-report-embeddings.json.gzip")
+            with gzip.open(path, "wt", encoding="utf8") as fp:
+                json.dump(
+                    {
+                        "embeddings": self.embeddings.tolist(),
+                        "reportNumbers": self.report_ids.tolist(),
+                    },
+                    fp,
+                )
+
+            index = retrieval.AccidentIndex.from_json(path)
+            self.assertEqual(len(index), 500)
+            self.assertEqual(index.embeddings.dtype, np.float32)
+            self.assertTrue(index.embeddings.flags["C_CONTIGUOUS"])
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+"""Tests for `farsight.tag_parser` module."""
+
+
+import unittest
+
+from farsight.tag_parser import TagStreamParser, parse_field, parse_stream, parse_tags
+
+
+class TestTagParser(unittest.TestCase):
+    """Tests for `farsight.tag_parser` module."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.harms = "\n".join(
+            "<harm>\n<explain>Harm {}</explain>\n<type>Economic loss</type>\n"
+            "<severity>severe</severity>\n</harm>".format(i)
+            for i in range(5)
+        )
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+
+    def test_records_across_chunks(self):
+        """Records should be parsed however the output is chunked."""
+        text = (
+            'intro <stakeholder type="direct" relevance="very relevant">Lawyers'
+            "</stakeholder>\n<stakeholder type='indirect'>Judges</stakeholder> end"
+        )
+
+        for chunk_size in [1, 2, 3, 7, len(text)]:
+            chunks = [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+            records = list(parse_stream(chunks, ["stakeholder"]))
+
+            self.assertEqual([r.text for r in records], ["Lawyers", "Judges"])
+            self.assertEqual(records[0].attrs["relevance"], "very relevant")
+            self.assertEqual(records[1].attrs["type"], "indirect")
+            self.assertTrue(all(r.complete for r in records))
+
+    def test_record_returned_on_closing_tag(self):
+        """A record should be returned as soon as its closing tag arrives."""
+        parser = TagStreamParser(["harm"])
+        self.assertEqual(parser.feed("<harm><explain>A</explain>"), [])
+        records = parser.feed("</harm><ha")
+        self.assertEqual(len(records), 1)
+        self.assertEqual(parse_field(records[0].text, "explain"), "A")
+        self.assertEqual(parser.close(), [])
+
+    def test_yields_early(self):
+        """Records should be yielded before the stream ends."""
+
+        def chunks():
+            yield self.harms[:150]
+            # The first harm must be yielded before the rest is generated
+            self.assertEqual(len(seen), 1)
+            yield self.harms[150:]
+
+        seen = []
+        for record in parse_stream(chunks(), ["harm"]):
+            seen.append(record)
+        self.assertEqual(len(seen), 5)
+
+    def test_malformed_output(self):
+        """Stray, nested, and interrupted tags should be tolerated."""
+        text = (
+            "</harm> stray <intended><intended>Nested</intended></intended>"
+            "<misuse>Interrupted <highstakes>Risky</HIGHSTAKES >"
+            "</misuse><intended>Last"
+        )
+        records = parse_tags(text, ["intended", "highstakes", "misuse"])
+
+        self.assertEqual(
+            [(r.tag, r.text, r.complete) for r in records],
+            [
+                ("intended", "Nested", True),
+                ("highstakes", "Risky", True),
+                ("intended", "Last", False),
+            ],
+        )
+
+    def test_truncated_output(self):
+        """A record cut off at the end should be returned as incomplete."""
+        text = self.harms[: self.harms.rfind("<severity>") + 3]
+        records = parse_tags(text, ["harm"])
+
+        self.assertEqual(len(records), 5)
+        self.assertFalse(records[-1].complete)
+        self.assertEqual(parse_field(records[-1].text, "explain"), "Harm 4")
+        self.assertIsNone(parse_field(records[-1].text, "severity"))
+
+        # Only a partial closing tag is left
+        records = parse_tags("<harm><explain>A</explain></ha", ["harm"])
+        self.assertEqual(records[0].text, "<explain>A</explain>")
+        self.assertEqual(parse_tags("<harm>  </ha", ["harm"]), [])
+
+    def test_bounded_memory(self):
+        """The parser should only keep a bounded amount of text."""
+        parser = TagStreamParser(["harm"], max_record_size=1000)
+
+        # An unclosed record is dropped once it grows too large
+        parser.feed("<harm>")
+        for _ in range(100):
+            self.assertEqual(parser.feed("x" * 100), [])
+            self.assertLessEqual(len(parser._buffer), 1100)
+
+        # Text outside records is not kept
+        for _ in range(100):
+            parser.feed("no tags here " * 10)
+            self.assertLess(len(parser._buffer), 200)
+
+        records = parser.feed(self.harms)
+        self.assertEqual(len(records), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()